@@ -0,0 +1,108 @@
+# In-memory free spot allocator
+
+import heapq
+from threading import Lock
+from models import db, ParkingSpot, SpotStatus
+
+
+class SpotAllocator:
+    """
+    Keeps a min-heap of free spot indexes per parking lot so that the lowest
+    free spot of a lot can be claimed in O(log n) without scanning the
+    parking_spots table.
+
+    The heap uses lazy deletion: `free` maps index -> spot_id for the spots
+    that are really free, and heap entries that are no longer in `free` are
+    skipped when popped. The structure is per process, so callers must still
+    confirm a claim with a conditional UPDATE (see ParkingSpot.try_occupy).
+    Lots are loaded from the database on their first claim, and lots whose
+    spots were reshaped in bulk are marked stale and reloaded on their next
+    claim, so a new process starts without reading the parking_spots table.
+    """
+
+    def __init__(self):
+        self._heaps = {}
+        self._free = {}
+        self._stale = set()
+        self._lock = Lock()
+
+    def init_app(self, app):
+        # Lots load lazily on their first claim
+        with self._lock:
+            self._heaps, self._free = {}, {}
+            self._stale.clear()
+
+    def _loaded(self, lot_id):
+        return lot_id in self._heaps and lot_id not in self._stale
+
+    def rebuild(self, lot_id=None):
+        """Rebuilds the free-spot structure for one lot, or for every lot."""
+        query = db.session.query(ParkingSpot.id, ParkingSpot.lot_id, ParkingSpot.spot_index).filter(
+            ParkingSpot.status == SpotStatus.AVAILABLE
+        )
+        if lot_id is not None:
+            query = query.filter(ParkingSpot.lot_id == lot_id)
+
+        heaps, free = {}, {}
+        for spot_id, spot_lot_id, index in query:
+            heaps.setdefault(spot_lot_id, []).append((index, spot_id))
+            free.setdefault(spot_lot_id, {})[index] = spot_id
+        for heap in heaps.values():
+            heapq.heapify(heap)
+
+        with self._lock:
+            if lot_id is None:
+                self._heaps, self._free = heaps, free
+                self._stale.clear()
+            else:
+                self._heaps[lot_id] = heaps.get(lot_id, [])
+                self._free[lot_id] = free.get(lot_id, {})
+                self._stale.discard(lot_id)
+
+    def invalidate(self, lot_id):
+        """Marks a lot for reloading from the database on its next claim."""
+        with self._lock:
+            self._stale.add(lot_id)
+
+    def claim(self, lot_id):
+        """Removes and returns the lowest free (index, spot_id) of a lot, or None when it is full."""
+        if not self._loaded(lot_id):
+            self.rebuild(lot_id)
+        with self._lock:
+            heap = self._heaps.get(lot_id)
+            free = self._free.get(lot_id)
+            while heap:
+                index, spot_id = heapq.heappop(heap)
+                if free.get(index) == spot_id:
+                    del free[index]
+                    return index, spot_id
+            return None
+
+    def release(self, lot_id, index, spot_id):
+        """Marks a spot as free again."""
+        with self._lock:
+            if not self._loaded(lot_id):
+                return
+            free = self._free.setdefault(lot_id, {})
+            if free.get(index) == spot_id:
+                return
+            free[index] = spot_id
+            heapq.heappush(self._heaps.setdefault(lot_id, []), (index, spot_id))
+
+    def discard(self, lot_id, index):
+        """Marks a spot as no longer free (booked directly or deleted)."""
+        with self._lock:
+            self._free.get(lot_id, {}).pop(index, None)
+
+    def forget(self, lot_id):
+        """Drops every entry of a deleted lot."""
+        with self._lock:
+            self._heaps.pop(lot_id, None)
+            self._free.pop(lot_id, None)
+
+    def free_count(self, lot_id):
+        with self._lock:
+            return len(self._free.get(lot_id, {}))
+
+
+allocator = SpotAllocator()
@@ -1,36 +1,53 @@
-from flask import Flask
+from flask import Flask, current_app
 from config import LocalDevelopmentConfig
-from models import db, create_admin
+from models import db, create_admin, init_lot_search, upgrade_schema
 from routes import api, register_blueprints
 from security import jwt
+from allocator import allocator
+from geoindex import geo_index
+from catalogue import catalogue
+from revocation import revocation
+from events import spot_events
 from flask_cors import CORS
 import os
 
-app = None
-
 def create_app():
+    """
+    Builds the web app without touching the database: the schema is created by
+    `flask --app app init-db`, and the in-memory indexes load on first use.
+    """
     app = Flask(__name__)
     app.config.from_object(LocalDevelopmentConfig)
     db.init_app(app)
     jwt.init_app(app)
+    revocation.init_app(app)
+    spot_events.init_app(app)
     api.init_app(app)
     CORS(
         app,
         origins="http://localhost:5173",
         supports_credentials=True,
+        expose_headers=["X-Next-Cursor"],
     )
     register_blueprints(app)
 
+    allocator.init_app(app)
+    geo_index.init_app(app)
+    catalogue.init_app(app)
 
-    with app.app_context():
-        db.create_all()
-        admin_email = os.getenv("ADMIN_EMAIL")
-        admin_password = os.getenv("ADMIN_PASSWORD")
-        create_admin(app,admin_email,admin_password)
+    app.cli.command("init-db")(init_db)
 
     return app
 
-app = create_app()
+def init_db():
+    """Create or upgrade the database tables, the lot search index and the admin account."""
+    db.create_all()
+    upgrade_schema()
+    init_lot_search()
+    admin_email = os.getenv("ADMIN_EMAIL")
+    admin_password = os.getenv("ADMIN_PASSWORD")
+    create_admin(current_app._get_current_object(), admin_email, admin_password)
+    print("Database initialized.")
 
 if __name__ == "__main__":
-    app.run()
\ No newline at end of file
+    create_app().run()
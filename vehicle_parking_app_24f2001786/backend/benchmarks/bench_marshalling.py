@@ -0,0 +1,88 @@
+"""
+Benchmark: serializing a large lot listing with nested spots.
+
+Compares the flask-restx path (marshal + json.dumps, as the default JSON
+representation does) with the compiled serializer and fast encoder
+(serializers.serialize + serializers.dumps), checks that both produce the same
+data, and reports the gzip and brotli sizes of the body.
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_marshalling [lots] [spots_per_lot]
+"""
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+from flask import Flask
+from flask_restx import Namespace, marshal
+from models import db, ParkingLot, ParkingSpot, parking_lot_get_model
+from serializers import serialize, dumps, brotli, orjson
+
+DEFAULT_LOTS = 200
+DEFAULT_SPOTS = 100
+ROUNDS = 5
+
+
+def make_app(db_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app
+
+
+def seed(lots, spots):
+    for n in range(lots):
+        lot = ParkingLot(
+            prime_location_name=f"Benchmark Lot {n}", pin_code="000000", city="Bench",
+            state="Bench", district="Bench", address="Bench", price_per_hour=10.0,
+            maximum_number_of_spots=spots, available_count=spots,
+        )
+        db.session.add(lot)
+        db.session.flush()
+        ParkingSpot.provision_range(lot.id, 1, spots)
+    db.session.commit()
+
+
+def best_of(fn):
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(lots, spots):
+    model = parking_lot_get_model(Namespace("bench"))
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, "bench.db"))
+        with app.app_context():
+            db.create_all()
+            seed(lots, spots)
+            rows = ParkingLot.preload_spots(ParkingLot.query.order_by(ParkingLot.id).all())
+
+            restx_marshal, marshalled = best_of(lambda: marshal(rows, model))
+            restx_dump, body = best_of(lambda: json.dumps(marshalled).encode())
+            compiled, serialized = best_of(lambda: serialize(rows, model))
+            fast_dump, fast_body = best_of(lambda: dumps(serialized))
+            assert json.loads(fast_body) == json.loads(body), "serializer output differs from marshal"
+
+            print(f"{lots} lots x {spots} spots, {len(body) / 1e6:.1f} MB of JSON (encoder: {'orjson' if orjson else 'json'})")
+            print(f"{'':>22} {'marshal (ms)':>13} {'encode (ms)':>12} {'total (ms)':>11}")
+            print(f"{'flask-restx + json':>22} {restx_marshal * 1000:>13.1f} {restx_dump * 1000:>12.1f} {(restx_marshal + restx_dump) * 1000:>11.1f}")
+            print(f"{'compiled + fast json':>22} {compiled * 1000:>13.1f} {fast_dump * 1000:>12.1f} {(compiled + fast_dump) * 1000:>11.1f}")
+            print(f"speed-up: {(restx_marshal + restx_dump) / (compiled + fast_dump):.1f}x")
+
+            gzip_time, gzipped = best_of(lambda: gzip.compress(fast_body, compresslevel=5))
+            print(f"gzip level 5: {len(gzipped) / 1e3:.0f} kB in {gzip_time * 1000:.1f} ms")
+            if brotli is not None:
+                brotli_time, compressed = best_of(lambda: brotli.compress(fast_body, quality=4))
+                print(f"brotli quality 4: {len(compressed) / 1e3:.0f} kB in {brotli_time * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    main(*(args + [DEFAULT_LOTS, DEFAULT_SPOTS][len(args):]))
@@ -0,0 +1,59 @@
+"""
+Benchmark: monthly report PDFs rendered per second on one core.
+
+Compares the old path, which builds a jinja2.Template from the inline HTML and
+lets WeasyPrint parse the embedded stylesheet for every document, with the
+shared rendering pipeline (rendering.render_monthly_report), which compiles the
+template once and reuses the parsed CSS and font configuration.
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_pdf_rendering [documents]
+"""
+import sys
+import time
+from jinja2 import Template
+from weasyprint import HTML
+from rendering import env, stylesheet_source, render_monthly_report
+
+DEFAULT_DOCUMENTS = 200
+
+INSIGHT = {
+    "username": "benchmark",
+    "total_bookings": 42,
+    "total_spent": 1234.5,
+    "most_used_lot_name": "Benchmark Lot",
+    "peak_day": "Friday",
+    "avg_duration": "2.5 hours",
+}
+MONTH_NAME = "January 2025"
+
+
+def per_document_template(documents):
+    # Rebuild the one-file template source the old task carried inline
+    source, _, _ = env.loader.get_source(env, "monthly_report.html")
+    inline_css = stylesheet_source("monthly_report.css")
+    for _ in range(documents):
+        html = Template(source).render(inline_css=inline_css, month_name=MONTH_NAME, **INSIGHT)
+        HTML(string=html).write_pdf()
+
+
+def shared_pipeline(documents):
+    for _ in range(documents):
+        render_monthly_report(INSIGHT, MONTH_NAME)
+
+
+def rate(fn, documents):
+    fn(1) # warm-up: fonts, template compilation, stylesheet parsing
+    start = time.perf_counter()
+    fn(documents)
+    return documents / (time.perf_counter() - start)
+
+
+def main(documents):
+    print(f"{'pipeline':>24} {'PDFs/sec/core':>14}")
+    print(f"{'per-document template':>24} {rate(per_document_template, documents):>14.1f}")
+    print(f"{'shared pipeline':>24} {rate(shared_pipeline, documents):>14.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DOCUMENTS)
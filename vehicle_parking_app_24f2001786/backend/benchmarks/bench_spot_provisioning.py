@@ -0,0 +1,79 @@
+"""
+Benchmark: creating the spots of a new parking lot.
+
+Compares the old one-ORM-object-per-spot loop with the batched executemany path
+(ParkingSpot.bulk_provision) and the single INSERT ... SELECT path
+(ParkingSpot.provision_range) against a throwaway SQLite file.
+
+Usage (from the backend folder):
+    python -m benchmarks.bench_spot_provisioning [sizes...]
+"""
+import os
+import sys
+import tempfile
+import time
+from flask import Flask
+from models import db, ParkingLot, ParkingSpot
+
+DEFAULT_SIZES = [100, 10_000, 100_000]
+
+
+def make_app(db_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app
+
+
+def new_lot(spots):
+    lot = ParkingLot(
+        prime_location_name="Benchmark Lot", pin_code="000000", city="Bench",
+        state="Bench", district="Bench", address="Bench", price_per_hour=10.0,
+        maximum_number_of_spots=spots, available_count=spots,
+    )
+    db.session.add(lot)
+    db.session.flush()
+    return lot
+
+
+def orm_loop(spots):
+    lot = new_lot(spots)
+    for i in range(1, spots + 1):
+        db.session.add(ParkingSpot(spot_number=f"{lot.id}-{i}", spot_index=i, lot_id=lot.id))
+    db.session.commit()
+
+
+def bulk_insert(spots):
+    lot = new_lot(spots)
+    ParkingSpot.bulk_provision(lot.id, range(1, spots + 1))
+    db.session.commit()
+
+
+def insert_select(spots):
+    lot = new_lot(spots)
+    ParkingSpot.provision_range(lot.id, 1, spots)
+    db.session.commit()
+
+
+def timed(fn, spots):
+    start = time.perf_counter()
+    fn(spots)
+    return time.perf_counter() - start
+
+
+def main(sizes):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, "bench.db"))
+        with app.app_context():
+            db.create_all()
+            print(f"{'spots':>10} {'orm loop (s)':>14} {'bulk (s)':>10} {'insert-select (s)':>18}")
+            for spots in sizes:
+                orm = timed(orm_loop, spots)
+                bulk = timed(bulk_insert, spots)
+                series = timed(insert_select, spots)
+                print(f"{spots:>10} {orm:>14.3f} {bulk:>10.3f} {series:>18.3f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
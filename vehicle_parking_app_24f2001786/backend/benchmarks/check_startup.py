@@ -0,0 +1,103 @@
+"""
+Budget check: cold start of the web app.
+
+Starts a fresh interpreter that imports app and calls create_app(), and fails
+(exit status 1) when the best of a few runs is over the time or peak RSS
+budget, or when a module the web process must not load (task modules,
+WeasyPrint, pandas, Celery) was imported. On failure the slowest imports are
+listed from `python -X importtime`.
+
+Usage (from the backend folder):
+    python -m benchmarks.check_startup [max_ms] [max_rss_mb]
+"""
+import json
+import os
+import subprocess
+import sys
+
+DEFAULT_MAX_MS = 1200
+DEFAULT_MAX_RSS_MB = 90
+RUNS = 3
+SLOWEST_IMPORTS = 15
+
+# Only needed by the Celery worker or by code paths that import them on first use
+FORBIDDEN_MODULES = ["tasks", "celery", "kombu", "weasyprint", "rendering", "pandas", "numpy"]
+
+CHILD = """
+import json, resource, sys, time
+start = time.perf_counter()
+from app import create_app
+create_app()
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "ms": elapsed * 1000,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": sorted(sys.modules),
+}))
+"""
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child_env():
+    env = dict(os.environ)
+    # create_app must not need a reachable database
+    env.setdefault("DATABASE_URL", "sqlite://")
+    return env
+
+
+def measure():
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=BACKEND_DIR, env=child_env(),
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def slowest_imports():
+    """Imports made directly by the top-level modules, by cumulative time in microseconds, slowest first."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "from app import create_app; create_app()"],
+        cwd=BACKEND_DIR, env=child_env(), capture_output=True, text=True,
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1:
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:SLOWEST_IMPORTS]
+
+
+def main(max_ms, max_rss_mb):
+    runs = [measure() for _ in range(RUNS)]
+    best_ms = min(run["ms"] for run in runs)
+    best_rss = min(run["rss_mb"] for run in runs)
+    loaded = set(runs[0]["modules"])
+    forbidden = [name for name in FORBIDDEN_MODULES if name in loaded]
+
+    print(f"cold start: {best_ms:.0f} ms (budget {max_ms} ms), peak RSS: {best_rss:.0f} MB (budget {max_rss_mb} MB)")
+    failures = []
+    if best_ms > max_ms:
+        failures.append(f"cold start {best_ms:.0f} ms is over the {max_ms} ms budget")
+    if best_rss > max_rss_mb:
+        failures.append(f"peak RSS {best_rss:.0f} MB is over the {max_rss_mb} MB budget")
+    if forbidden:
+        failures.append(f"create_app imported {', '.join(forbidden)}")
+
+    if not failures:
+        print("OK")
+        return 0
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("slowest imports (cumulative ms):")
+    for cumulative, name in slowest_imports():
+        print(f"{cumulative / 1000:>10.1f}  {name}")
+    return 1
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    sys.exit(main(*(args + [DEFAULT_MAX_MS, DEFAULT_MAX_RSS_MB][len(args):])))
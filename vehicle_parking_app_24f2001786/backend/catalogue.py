@@ -0,0 +1,249 @@
+# Vehicle Catalogue Snapshot
+
+import bisect
+import csv
+import logging
+import mmap
+import os
+import struct
+import sys
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MAGIC = b"VCATALG1"
+# Magic, then the byte offsets of the brand, model and color sections
+HEADER = struct.Struct("<8s3I")
+U32 = struct.Struct("<I")
+PAIR = struct.Struct("<2I")
+
+
+def sort_key(name):
+    return name.casefold()
+
+
+# --- Build Step ---
+
+def read_sources(cars_csv, colors_csv):
+    """Reads the catalogue CSVs into {brand: sorted models} and sorted colors."""
+    models_by_brand = {}
+    with open(cars_csv, newline="", encoding="latin1") as f:
+        for row in csv.DictReader(f):
+            brand = (row.get("Company Names") or "").strip().title()
+            model = row.get("Cars Names") or ""
+            if brand and model:
+                models_by_brand.setdefault(brand, set()).add(model)
+
+    with open(colors_csv, newline="", encoding="latin1") as f:
+        colors = {row["name"] for row in csv.DictReader(f) if row.get("name")}
+
+    models_by_brand = {
+        brand: sorted(models, key=lambda m: (sort_key(m), m)) for brand, models in models_by_brand.items()
+    }
+    return models_by_brand, sorted(colors, key=lambda c: (sort_key(c), c))
+
+
+def _pack_strings(strings):
+    """u32 count, u32 end offsets, then the UTF-8 bytes, padded to 4 bytes."""
+    blobs = [s.encode("utf-8") for s in strings]
+    ends, total = [], 0
+    for blob in blobs:
+        total += len(blob)
+        ends.append(total)
+    data = U32.pack(len(blobs)) + struct.pack(f"<{len(ends)}I", *ends) + b"".join(blobs)
+    return data + b"\0" * (-len(data) % 4)
+
+
+def build_snapshot(cars_csv, colors_csv, path):
+    """
+    Compiles the CSVs into one binary snapshot: case-insensitively sorted string
+    tables for brands, models (grouped by brand) and colors, and per-brand model
+    ranges. The file is written next to its final name and swapped in, so
+    workers never map a half-written snapshot.
+    """
+    models_by_brand, colors = read_sources(cars_csv, colors_csv)
+    brands = sorted(models_by_brand, key=lambda b: (sort_key(b), b))
+
+    model_starts, models = [0], []
+    for brand in brands:
+        models.extend(models_by_brand[brand])
+        model_starts.append(len(models))
+
+    brand_section = _pack_strings(brands) + struct.pack(f"<{len(model_starts)}I", *model_starts)
+    model_section = _pack_strings(models)
+    color_section = _pack_strings(colors)
+
+    offset = HEADER.size
+    offsets = [offset, offset + len(brand_section), offset + len(brand_section) + len(model_section)]
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.part"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, *offsets))
+        f.write(brand_section)
+        f.write(model_section)
+        f.write(color_section)
+    os.replace(tmp_path, path)
+    return len(brands), len(models), len(colors)
+
+
+# --- Snapshot Reader ---
+
+class StringTable:
+    """Read-only sequence over a packed string table inside the mapped snapshot."""
+
+    def __init__(self, buf, offset):
+        self.buf = buf
+        self.count = U32.unpack_from(buf, offset)[0]
+        self.ends = offset + 4
+        self.data = self.ends + 4 * self.count
+        self.end = self.data + (U32.unpack_from(buf, self.ends + 4 * (self.count - 1))[0] if self.count else 0)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i == 0:
+            start, end = 0, U32.unpack_from(self.buf, self.ends)[0]
+        else:
+            start, end = PAIR.unpack_from(self.buf, self.ends + 4 * (i - 1))
+        return self.buf[self.data + start:self.data + end].decode("utf-8")
+
+    def slice(self, lo, hi):
+        """Entries lo..hi-1, reading their offsets with one unpack."""
+        if hi <= lo:
+            return []
+        first = U32.unpack_from(self.buf, self.ends + 4 * (lo - 1))[0] if lo else 0
+        ends = struct.unpack_from(f"<{hi - lo}I", self.buf, self.ends + 4 * lo)
+        blob = self.buf[self.data + first:self.data + ends[-1]]
+        out, start = [], 0
+        for end in ends:
+            out.append(blob[start:end - first].decode("utf-8"))
+            start = end - first
+        return out
+
+    def prefix_range(self, prefix, lo=0, hi=None):
+        """Index range of the entries in [lo, hi) whose case-insensitive key starts with `prefix`."""
+        hi = self.count if hi is None else hi
+        key = sort_key(prefix)
+        start = bisect.bisect_left(self, key, lo, hi, key=sort_key)
+        stop = bisect.bisect_left(self, key + "\U0010ffff", start, hi, key=sort_key)
+        return start, stop
+
+
+class Catalogue:
+    """
+    Vehicle brands, models and colors served from a memory-mapped snapshot.
+    The mapping is read-only and file backed, so every worker on a host shares
+    the same pages instead of keeping its own parsed copy. Listings and prefix
+    lookups decode only the entries they return.
+    """
+
+    def __init__(self):
+        self.path = None
+        self._map = None
+        self._loaded = False
+        self._lock = Lock()
+
+    def init_app(self, app):
+        source_dir = app.config.get("CATALOGUE_SOURCE_DIR", BASE_DIR)
+        self.cars_csv = os.path.join(source_dir, "Cars.csv")
+        self.colors_csv = os.path.join(source_dir, "colors.csv")
+        self.path = app.config.get("CATALOGUE_SNAPSHOT", os.path.join(BASE_DIR, "instance", "vehicle_catalogue.bin"))
+        # The snapshot is mapped on the first lookup
+        self._map, self._loaded = None, False
+
+    def _stale(self):
+        try:
+            built = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return True
+        return any(os.stat(source).st_mtime_ns > built for source in (self.cars_csv, self.colors_csv))
+
+    def _open(self):
+        """Maps the snapshot, building it first when it is missing or older than the CSVs."""
+        try:
+            if self._stale():
+                counts = build_snapshot(self.cars_csv, self.colors_csv, self.path)
+                logger.info("Built vehicle catalogue snapshot: %d brands, %d models, %d colors", *counts)
+            with open(self.path, "rb") as f:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                st = os.fstat(f.fileno())
+            magic, brands, models, colors = HEADER.unpack_from(buf, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is not a vehicle catalogue snapshot")
+            brand_table = StringTable(buf, brands)
+            return {
+                "buf": buf,
+                "version": (st.st_size, st.st_mtime_ns),
+                "brands": brand_table,
+                "model_starts": brand_table.end + (-brand_table.end % 4),
+                "models": StringTable(buf, models),
+                "colors": StringTable(buf, colors),
+            }
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Vehicle catalogue unavailable: {e}")
+            return None
+
+    def load(self):
+        """(Re)maps the snapshot now."""
+        with self._lock:
+            self._map, self._loaded = self._open(), True
+
+    def _snapshot(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self._map, self._loaded = self._open(), True
+        return self._map
+
+    @property
+    def version(self):
+        """Size and modification time of the mapped snapshot, for HTTP validators."""
+        snapshot = self._snapshot()
+        return snapshot["version"] if snapshot is not None else None
+
+    def _lookup(self, table, prefix=None, limit=None, lo=0, hi=None):
+        hi = len(table) if hi is None else hi
+        if prefix:
+            lo, hi = table.prefix_range(prefix, lo, hi)
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return table.slice(lo, hi)
+
+    def brands(self, prefix=None, limit=None):
+        snapshot = self._snapshot()
+        if snapshot is None:
+            return []
+        return self._lookup(snapshot["brands"], prefix, limit)
+
+    def models(self, brand, prefix=None, limit=None):
+        """Models of a brand (matched case-insensitively), or None for an unknown brand."""
+        snapshot = self._snapshot()
+        if snapshot is None:
+            return None
+        brands = snapshot["brands"]
+        lo, hi = brands.prefix_range(brand.strip())
+        matches = [i for i in range(lo, hi) if sort_key(brands[i]) == sort_key(brand.strip())]
+        if not matches:
+            return None
+        start, end = PAIR.unpack_from(snapshot["buf"], snapshot["model_starts"] + 4 * matches[0])
+        return self._lookup(snapshot["models"], prefix, limit, start, end)
+
+    def colors(self, prefix=None, limit=None):
+        snapshot = self._snapshot()
+        if snapshot is None:
+            return []
+        return self._lookup(snapshot["colors"], prefix, limit)
+
+
+catalogue = Catalogue()
+
+
+if __name__ == "__main__":
+    # Build step: python catalogue.py [snapshot path]
+    target = sys.argv[1] if len(sys.argv) > 1 else os.path.join(BASE_DIR, "instance", "vehicle_catalogue.bin")
+    counts = build_snapshot(os.path.join(BASE_DIR, "Cars.csv"), os.path.join(BASE_DIR, "colors.csv"), target)
+    print("Built %s: %d brands, %d models, %d colors" % ((target,) + counts))
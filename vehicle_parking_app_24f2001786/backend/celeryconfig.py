@@ -13,6 +13,8 @@ task_serializer='json'
 accept_content=['json']
 result_serializer='json'
 enable_utc=True
+# Task modules the worker registers. The web app sends tasks by name (see task_queue)
+imports = ('tasks',)
 beat_schedule = {
         # Daily Reminder - Runs every day at 8:00 AM
         'send-daily-reminders': {
@@ -28,6 +30,14 @@ beat_schedule = {
             'task': 'tasks.cleanup_expired_tokens',
             'schedule': crontab(hour=2, minute=30, day_of_week=0),  # Sunday
         },
+        'reconcile-lot-counters': {
+            'task': 'tasks.reconcile_lot_counters',
+            'schedule': crontab(hour=3, minute=0),
+        },
+        'cleanup-exports': {
+            'task': 'tasks.cleanup_exports',
+            'schedule': crontab(hour=3, minute=30),
+        },
         # # Optional: Test job that runs every minute (for testing purposes)
         # # Remove or comment out in production
         # 'test-job-every-minute': {
@@ -16,6 +16,19 @@ class Config:
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=15)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=7)
     JWT_COOKIE_CSRF_PROTECT = True
+    # Seconds a resolved JWT user stays cached (0 disables the identity cache)
+    JWT_USER_CACHE_TTL = 30
+    # Seconds a process serves a user from its own dict; invalidation only reaches this process and Redis
+    JWT_USER_LOCAL_CACHE_TTL = 5
+    # Embed the user's role in access tokens so admin checks need no user lookup
+    JWT_ROLE_IN_CLAIMS = True
+
+    # --- Token Revocation ---
+    TOKEN_REVOCATION_BACKEND = os.getenv("TOKEN_REVOCATION_BACKEND", "redis") # 'redis' or 'sql'
+    TOKEN_REVOCATION_REDIS_URL = os.getenv("TOKEN_REVOCATION_REDIS_URL", os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"))
+    TOKEN_REVOCATION_BLOOM_CAPACITY = 100000
+    TOKEN_REVOCATION_BLOOM_REFRESH = 5 # Seconds between Bloom filter rebuilds from Redis
+    TOKEN_REVOCATION_REDIS_RETRY = 30 # Seconds to answer from SQL only after a Redis failure
 
     # --- Email Server Configuration ---
     SMTP_SERVER_HOST = os.getenv("SMTP_SERVER_HOST", "localhost")
@@ -23,6 +36,38 @@ class Config:
     SMTP_USERNAME = os.getenv("SMTP_USERNAME")
     SENDER_PASSWORD = os.getenv("SENDER_PASSWORD")
     SENDER_ADDRESS = os.getenv("SENDER_ADDRESS")
+    SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 4)) # Idle SMTP sessions kept open per worker process
+    SMTP_POOL_IDLE_TIMEOUT = 30 # Seconds after which an idle session is checked with NOOP before reuse
+
+    # --- Report Rendering ---
+    # Compiled Jinja templates are cached here so worker restarts skip recompiling
+    TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "jinja_cache"))
+
+    # --- Data Exports ---
+    EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "exports"))
+    EXPORT_BASE_URL = os.getenv("EXPORT_BASE_URL", "http://localhost:5000") # Public URL of this API, used in download links
+    EXPORT_LINK_MAX_AGE = 7 * 24 * 3600 # Seconds a signed download link stays valid
+    ADMIN_EXPORT_LINK_MAX_AGE = 3600 # Seconds an admin export link stays valid; it also needs an admin login
+    EXPORT_ATTACHMENT_LIMIT = 5 * 1024 * 1024 # Compressed exports above this size are sent as a download link
+    EXPORT_CHUNK_SIZE = 10000 # Rows fetched from the server-side cursor and written per chunk
+
+    # --- Live Spot Events ---
+    SPOT_EVENTS_BACKEND = os.getenv("SPOT_EVENTS_BACKEND", "redis") # 'redis' or 'memory' (single process only)
+    SPOT_EVENTS_REDIS_URL = os.getenv("SPOT_EVENTS_REDIS_URL", os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"))
+    SPOT_EVENTS_QUEUE_SIZE = 1000 # Undelivered messages buffered per stream before it is told to resync
+    SPOT_EVENTS_HEARTBEAT = 15 # Seconds between keep-alive comments on an idle stream
+    SPOT_EVENTS_MAX_DURATION = 300 # Seconds before a stream is closed; the client reconnects and refetches
+    SPOT_EVENTS_MAX_STREAMS = 20 # Open streams per process; each holds a worker thread or greenlet
+
+    # --- Vehicle Catalogue ---
+    CATALOGUE_SOURCE_DIR = os.path.dirname(os.path.abspath(__file__)) # Folder holding Cars.csv and colors.csv
+    CATALOGUE_SNAPSHOT = os.getenv("CATALOGUE_SNAPSHOT", os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "vehicle_catalogue.bin"))
+
+    # --- Response Serialization ---
+    FAST_JSON = True # Encode API responses with orjson (stdlib json fallback) and compress large ones
+    JSON_COMPRESS_MIN_SIZE = 1024 # Bytes; smaller JSON bodies are sent uncompressed
+    JSON_GZIP_LEVEL = 5
+    JSON_BROTLI_QUALITY = 4
 
     # --- Caching Configuration ---
     CACHE_TYPE = "RedisCache"
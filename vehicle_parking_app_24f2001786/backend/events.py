@@ -0,0 +1,223 @@
+# Live spot availability events
+
+import json
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Status sent for spots that were deleted or trimmed away by a resize
+REMOVED = "removed"
+
+
+class Subscription:
+    """One stream's bounded queue of messages. A consumer that falls behind is flagged instead of blocking publishers."""
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventStream:
+    """
+    Iterates one stream's server-sent events. The WSGI server calls close()
+    when the client disconnects or the stream ends, even if it never started
+    iterating, so the subscription and the stream slot are always given back.
+    """
+
+    def __init__(self, chunks, release):
+        self.chunks = chunks
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.chunks)
+
+    def close(self):
+        self.chunks.close()
+        if self._release is not None:
+            release, self._release = self._release, None
+            release()
+
+
+class InProcessBroker:
+    """Fans messages out to the subscribers of this process only; for development and single-process setups."""
+
+    def __init__(self, queue_size=1000):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def publish(self, message):
+        self._deliver(message)
+
+    def _deliver(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.put(message)
+
+    def subscribe(self):
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+
+class RedisBroker(InProcessBroker):
+    """
+    Publishes through a Redis pub/sub channel so every worker sees every change.
+    Each process holds a single Redis subscription, started with its first
+    stream, and fans the messages out to its local streams, so the number of
+    open dashboards does not multiply the load on Redis or the database.
+    """
+
+    CHANNEL = "spot_events"
+
+    def __init__(self, client, queue_size=1000):
+        super().__init__(queue_size)
+        self.client = client
+        self._listener = None
+
+    def publish(self, message):
+        try:
+            self.client.publish(self.CHANNEL, json.dumps(message))
+        except Exception as e:
+            logger.error(f"Spot event publish failed, delivering to this process only: {e}")
+            self._deliver(message)
+
+    def subscribe(self):
+        subscription = super().subscribe()
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name="spot-events", daemon=True)
+                self._listener.start()
+        return subscription
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.CHANNEL)
+                for item in pubsub.listen():
+                    if item.get("type") == "message":
+                        self._deliver(json.loads(item["data"]))
+            except Exception as e:
+                logger.error(f"Spot event subscription lost, reconnecting: {e}")
+                time.sleep(1)
+
+
+class SpotEvents:
+    """
+    Selects the event broker from SPOT_EVENTS_BACKEND ('redis' or 'memory').
+    Every open stream holds a worker thread or greenlet, so streams are capped
+    per process (SPOT_EVENTS_MAX_STREAMS) and closed after
+    SPOT_EVENTS_MAX_DURATION seconds; clients reconnect and refetch.
+    """
+
+    def __init__(self):
+        self.broker = InProcessBroker()
+        self.heartbeat = 15
+        self.max_duration = 300
+        self.max_streams = 20
+        self._open_streams = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        queue_size = app.config.get("SPOT_EVENTS_QUEUE_SIZE", 1000)
+        self.heartbeat = app.config.get("SPOT_EVENTS_HEARTBEAT", 15)
+        self.max_duration = app.config.get("SPOT_EVENTS_MAX_DURATION", 300)
+        self.max_streams = app.config.get("SPOT_EVENTS_MAX_STREAMS", 20)
+        if app.config.get("SPOT_EVENTS_BACKEND") == "redis":
+            import redis
+            client = redis.Redis.from_url(app.config["SPOT_EVENTS_REDIS_URL"])
+            self.broker = RedisBroker(client, queue_size)
+        else:
+            self.broker = InProcessBroker(queue_size)
+
+    def publish(self, lot_id, changes):
+        """
+        Announces committed spot status changes of one lot; `changes` holds
+        (spot_id, status) pairs. Call it after invalidating the lot's spot tags
+        (cache_tags.spot_tags): the current 'spots:<id>' version is sent with
+        every delta, so clients can drop deltas older than the data they fetched.
+        """
+        if not changes:
+            return
+        from routes import cache_tags
+        version = cache_tags.tag_versions([f"spots:{lot_id}"])[0]
+        self.broker.publish([
+            {
+                "lot_id": lot_id,
+                "spot_id": spot_id,
+                "status": getattr(status, "value", status),
+                "version": version,
+            }
+            for spot_id, status in changes
+        ])
+
+    def stream(self, lot_id=None):
+        """
+        Subscribes now and returns an EventStream with the deltas of one lot,
+        or of every lot, or None when this process already has max_streams
+        streams open. Comment lines keep idle connections open, a 'resync'
+        event tells a client that fell behind to refetch, and the stream ends
+        after max_duration seconds so it cannot hold a worker forever. The
+        generator does not use the app context, so the request's database
+        session is released as soon as the response starts.
+        """
+        with self._lock:
+            if self._open_streams >= self.max_streams:
+                return None
+            self._open_streams += 1
+        broker, heartbeat = self.broker, self.heartbeat
+        deadline = time.monotonic() + self.max_duration
+        subscription = broker.subscribe()
+
+        def release():
+            broker.unsubscribe(subscription)
+            with self._lock:
+                self._open_streams -= 1
+
+        def generate():
+            yield "retry: 5000\n\n"
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    yield "event: resync\ndata: {}\n\n"
+                deltas = subscription.get(min(heartbeat, remaining))
+                if deltas is None:
+                    yield ": keepalive\n\n"
+                    continue
+                if lot_id is not None:
+                    deltas = [delta for delta in deltas if delta["lot_id"] == lot_id]
+                    if not deltas:
+                        continue
+                yield f"event: spots\ndata: {json.dumps(deltas, separators=(',', ':'))}\n\n"
+
+        return EventStream(generate(), release)
+
+spot_events = SpotEvents()
@@ -0,0 +1,45 @@
+# Signed Export Download Links
+
+import os
+from flask import current_app
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+
+# Export files live under EXPORT_DIR and are handed out through signed,
+# expiring links. The web process only resolves links, so this module stays
+# free of the task modules that write the files. Admin exports cover every
+# user, so their links use their own salt, expire after
+# ADMIN_EXPORT_LINK_MAX_AGE and are only served to a logged-in admin.
+
+_SALT = "parking-export"
+_ADMIN_SALT = "parking-admin-export"
+
+
+def export_dir():
+    path = current_app.config["EXPORT_DIR"]
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _serializer(admin=False):
+    return URLSafeTimedSerializer(current_app.config["JWT_SECRET_KEY"], salt=_ADMIN_SALT if admin else _SALT)
+
+
+def sign_export(filename, admin=False):
+    """Returns a URL-safe token granting download of one export file."""
+    return _serializer(admin).dumps(filename)
+
+
+def resolve_export(token, admin=False):
+    """Returns the path of the export a token grants, or None if it is invalid, expired or gone."""
+    max_age = current_app.config["ADMIN_EXPORT_LINK_MAX_AGE" if admin else "EXPORT_LINK_MAX_AGE"]
+    try:
+        filename = _serializer(admin).loads(token, max_age=max_age)
+    except BadSignature:
+        return None
+    path = os.path.join(current_app.config["EXPORT_DIR"], os.path.basename(filename))
+    return path if os.path.isfile(path) else None
+
+
+def download_url(filename, admin=False):
+    route = "admin/exports/download" if admin else "users/exports"
+    return f"{current_app.config['EXPORT_BASE_URL'].rstrip('/')}/{route}/{sign_export(filename, admin)}"
@@ -0,0 +1,175 @@
+# In-memory spatial index of parking lots
+
+import heapq
+import math
+from threading import Lock
+from models import db, ParkingLot
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.radians(EARTH_RADIUS_KM)
+# Grid cell edge in degrees of latitude (about 5.5 km)
+CELL_DEG = 0.05
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+class LotGeoIndex:
+    """
+    Buckets active lots with coordinates into a fixed latitude/longitude grid so
+    that the lots around a point are found by visiting the few cells in range
+    instead of scanning the parking_lots table.
+
+    The grid is per process. Writers bump the 'lots:geo' cache tag, and each
+    query compares the tag version with the one the grid was built from and
+    reloads when another worker changed a lot.
+    """
+
+    TAG = "lots:geo"
+
+    def __init__(self, cell_deg=CELL_DEG):
+        self.cell_deg = cell_deg
+        self._columns = int(round(360 / cell_deg))
+        self._cells = {}
+        self._points = {}
+        self._version = None
+        self._lock = Lock()
+
+    def init_app(self, app):
+        # The grid is built by the first query, when the tag version is compared
+        with self._lock:
+            self._cells, self._points, self._version = {}, {}, None
+
+    def _cell(self, lat, lon):
+        # Longitude columns wrap around the antimeridian
+        return (math.floor(lat / self.cell_deg), math.floor((lon + 180) / self.cell_deg) % self._columns)
+
+    def rebuild(self):
+        """Reloads every active lot with coordinates."""
+        from routes import cache_tags
+        version = cache_tags.tag_versions([self.TAG])[0]
+        rows = db.session.query(ParkingLot.id, ParkingLot.latitude, ParkingLot.longitude).filter(
+            ParkingLot.is_active == True,
+            ParkingLot.latitude.isnot(None),
+            ParkingLot.longitude.isnot(None),
+        )
+        cells, points = {}, {}
+        for lot_id, lat, lon in rows:
+            points[lot_id] = (lat, lon)
+            cells.setdefault(self._cell(lat, lon), set()).add(lot_id)
+        with self._lock:
+            self._cells, self._points, self._version = cells, points, version
+
+    def _ensure_current(self):
+        from routes import cache_tags
+        if cache_tags.tag_versions([self.TAG])[0] != self._version:
+            self.rebuild()
+
+    def _place(self, lot_id, point):
+        """Moves one lot to `point`, or drops it from the grid when `point` is None."""
+        with self._lock:
+            cells, points = dict(self._cells), dict(self._points)
+            old = points.pop(lot_id, None)
+            if old is not None:
+                cell = self._cell(*old)
+                cells[cell] = cells[cell] - {lot_id}
+                if not cells[cell]:
+                    del cells[cell]
+            if point is not None:
+                points[lot_id] = point
+                cell = self._cell(*point)
+                cells[cell] = cells.get(cell, set()) | {lot_id}
+            self._cells, self._points = cells, points
+
+    def _publish(self, lot_id, point):
+        """
+        Applies a change locally and bumps the shared tag so other workers reload.
+        The new version is adopted only if nobody else bumped the tag in between,
+        otherwise the next query rebuilds.
+        """
+        from routes import cache_tags
+        before = self._version
+        cache_tags.invalidate(self.TAG)
+        self._place(lot_id, point)
+        after = cache_tags.tag_versions([self.TAG])[0]
+        if before is not None and after == before + 1:
+            self._version = after
+
+    def update(self, lot):
+        """Re-indexes a lot after it was created or edited."""
+        point = None
+        if lot.is_active and lot.latitude is not None and lot.longitude is not None:
+            point = (lot.latitude, lot.longitude)
+        self._publish(lot.id, point)
+
+    def remove(self, lot_id):
+        """Drops a deleted lot from the index."""
+        self._publish(lot_id, None)
+
+    def nearby(self, lat, lon, radius_km):
+        """
+        Yields (distance_km, lot_id) for the lots within `radius_km` of a point,
+        nearest first. Cells are visited in growing rectangles around the point,
+        and a lot is only yielded once no unvisited cell can hold a closer one.
+        """
+        self._ensure_current()
+        with self._lock:
+            cells, points = self._cells, self._points
+
+        cell_km = self.cell_deg * KM_PER_DEGREE
+        # Longitude degrees shrink towards the poles, so rings span more columns than rows
+        widest_lat = min(abs(lat) + radius_km / KM_PER_DEGREE, 90)
+        lon_scale = math.cos(math.radians(widest_lat))
+        max_half_width = (self._columns - 1) // 2
+
+        def half_width(ring):
+            if lon_scale * max_half_width <= ring:
+                return max_half_width
+            return min(int(math.ceil(ring / lon_scale)), max_half_width)
+
+        row, column = self._cell(lat, lon)
+        heap = []
+        prev_rows, prev_width = -1, -1
+        ring = 0
+        while True:
+            width = half_width(ring)
+            for dlat in range(-ring, ring + 1):
+                if abs(dlat) > prev_rows:
+                    dlons = range(-width, width + 1)
+                else:
+                    # Only the columns this ring added to rows already visited
+                    added = range(prev_width + 1, width + 1)
+                    dlons = [*added, *(-d for d in added)]
+                for dlon in dlons:
+                    for lot_id in cells.get((row + dlat, (column + dlon) % self._columns), ()):
+                        plat, plon = points[lot_id]
+                        distance = haversine_km(lat, lon, plat, plon)
+                        if distance <= radius_km:
+                            heapq.heappush(heap, (distance, lot_id))
+            prev_rows, prev_width = ring, width
+
+            # Every unvisited cell is at least this far from the point, less a 1%
+            # margin because great circles cut slightly inside the parallels
+            if width == max_half_width:
+                covered_km = ring * cell_km
+            else:
+                covered_km = min(ring * cell_km, width * cell_km * lon_scale) * 0.99
+            while heap and heap[0][0] <= covered_km:
+                yield heapq.heappop(heap)
+            if covered_km >= radius_km:
+                break
+            ring += 1
+        while heap:
+            yield heapq.heappop(heap)
+
+    def __len__(self):
+        return len(self._points)
+
+
+geo_index = LotGeoIndex()
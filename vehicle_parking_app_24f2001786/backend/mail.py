@@ -1,6 +1,8 @@
 import smtplib
 import os
+import time
 import logging
+from threading import Lock
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
@@ -13,9 +15,9 @@ config = LocalDevelopmentConfig()
 # Configure logger
 logger = logging.getLogger(__name__)
 
-def send_email(to_address, subject, message, content="html", attachment_file=None, attachment_data=None, attachment_filename=None):
+def build_message(to_address, subject, message, content="html", attachment_file=None, attachment_data=None, attachment_filename=None):
     """
-    Sends an email using SMTP configuration.
+    Builds the MIME message for an email.
     It can handle file-based attachments (attachment_file) and
     in-memory data attachments (attachment_data), automatically
     handling whether the data is a string or bytes.
@@ -56,17 +58,154 @@ def send_email(to_address, subject, message, content="html", attachment_file=Non
         except FileNotFoundError:
             print(f"❌ Attachment file not found: {attachment_file}")
             # Decide if you want to send the email anyway or return False
-            # return False 
+            # return False
+
+    return msg
+
+
+class SMTPPool:
+    """
+    Per-process pool of open, authenticated SMTP sessions, so consecutive mails
+    reuse a connection instead of paying a TCP and login handshake each.
+    Sessions idle for longer than `idle_timeout` are checked with NOOP before
+    reuse, and a send that finds the server gone reconnects once and retries.
+    The pool is reset in forked children (Celery prefork workers).
+    """
+
+    def __init__(self, host, port, username=None, password=None, size=4, idle_timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle = [] # (connection, last_used)
+        self._lock = Lock()
+        self._pid = os.getpid()
+
+    def _connect(self):
+        conn = smtplib.SMTP(host=self.host, port=self.port)
+        # For MailHog, login isn’t required
+        if self.username and self.password:
+            conn.login(self.username, self.password)
+        return conn
+
+    def checkout(self):
+        """Returns an idle live session, or opens a new one."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Connections inherited from the parent process must not be shared
+                self._idle, self._pid = [], os.getpid()
+            while self._idle:
+                conn, last_used = self._idle.pop()
+                if time.monotonic() - last_used < self.idle_timeout:
+                    return conn
+                try:
+                    if conn.noop()[0] == 250:
+                        return conn
+                except (smtplib.SMTPException, OSError):
+                    # A dead socket raises OSError (e.g. ConnectionResetError) rather than an SMTP error
+                    pass
+                self.discard(conn)
+        return self._connect()
+
+    def checkin(self, conn):
+        """Returns a healthy session to the pool, closing it if the pool is full."""
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        self.discard(conn)
+
+    @staticmethod
+    def discard(conn):
+        """Closes a session that must not be reused."""
+        try:
+            conn.quit()
+        except (smtplib.SMTPException, OSError):
+            conn.close()
 
+    def send(self, conn, msg):
+        """Sends one message on `conn`, reconnecting once if the server dropped it. Returns the live connection."""
+        try:
+            conn.send_message(msg)
+            return conn
+        except smtplib.SMTPServerDisconnected:
+            logger.info("SMTP server disconnected, reconnecting.")
+            conn.close()
+            conn = self._connect()
+            conn.send_message(msg)
+            return conn
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self.discard(conn)
+
+
+pool = SMTPPool(
+    config.SMTP_SERVER_HOST,
+    config.SMTP_SERVER_PORT,
+    username=config.SMTP_USERNAME,
+    password=config.SENDER_PASSWORD,
+    size=config.SMTP_POOL_SIZE,
+    idle_timeout=config.SMTP_POOL_IDLE_TIMEOUT,
+)
+
+
+def send_email(to_address, subject, message, content="html", attachment_file=None, attachment_data=None, attachment_filename=None):
+    """Sends an email over a pooled SMTP session. Returns True when it was accepted."""
+    msg = build_message(to_address, subject, message, content, attachment_file, attachment_data, attachment_filename)
     try:
-        with smtplib.SMTP(host=config.SMTP_SERVER_HOST, port=config.SMTP_SERVER_PORT) as s:
-            # For MailHog, login isn’t required
-            if config.SMTP_USERNAME and config.SENDER_PASSWORD:
-                s.login(config.SMTP_USERNAME, config.SENDER_PASSWORD)
-            s.send_message(msg)
-            print(f"✅ Email sent to {to_address}")
-            return True
+        conn = pool.checkout()
+        try:
+            conn = pool.send(conn, msg)
+        except BaseException:
+            pool.discard(conn)
+            raise
+        pool.checkin(conn)
+        print(f"✅ Email sent to {to_address}")
+        return True
     except Exception as e:
         print(f"❌ Failed to send email to {to_address}: {e}")
         return False
 
+
+def send_many(emails, on_result=None):
+    """
+    Sends a batch of emails over one pooled SMTP session.
+    `emails` is an iterable of dicts of send_email keyword arguments; it is
+    consumed one email at a time, so a generator keeps only one in memory.
+    `on_result(email, sent)` is called right after each email is accepted or
+    fails, before the next one is built.
+    Returns one bool per email, in order; a failed recipient does not stop the batch.
+    """
+    results = []
+    conn = None
+    try:
+        for email in emails:
+            msg = build_message(**email)
+            try:
+                if conn is None:
+                    conn = pool.checkout()
+                conn = pool.send(conn, msg)
+                sent = True
+            except smtplib.SMTPRecipientsRefused as e:
+                # The session is still usable after a refused recipient
+                logger.error(f"Failed to send email to {email['to_address']}: {e}")
+                sent = False
+            except Exception as e:
+                logger.error(f"Failed to send email to {email['to_address']}: {e}")
+                sent = False
+                if conn is not None:
+                    pool.discard(conn)
+                    conn = None
+            results.append(sent)
+            if on_result is not None:
+                on_result(email, sent)
+    finally:
+        if conn is not None:
+            pool.checkin(conn)
+    logger.info(f"Sent {sum(results)} of {len(results)} email(s) in one batch.")
+    return results
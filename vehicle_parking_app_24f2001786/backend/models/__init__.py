@@ -12,11 +12,15 @@ class EnumField(fields.Raw):
 
 from .user import User, UserRole, user_register_model, user_login_model, display_user_model
 from .parkingSpot import ParkingSpot, parking_spot_get_model, SpotStatus
-from .parkingLot import ParkingLot, parking_lot_get_model, parking_lot_post_model, parking_lot_put_model
+from .parkingLot import ParkingLot, parking_lot_get_model, parking_lot_list_model, parking_lot_post_model, parking_lot_put_model
 from .reservation import ReservedParkingSpot, reservation_post_model, reservation_get_model, reservation_put_model, ReservationStatus
 from .payment import Payment, payment_post_model, PaymentStatus
 from .vehicle import Vehicle, vehicle_model
 from .tokens import TokenBlocklist
+from .reportDelivery import ReportDelivery
+from .lotRollup import LotHourlyRollup, rollup_bucket_model, rollup_lot_model
+from .lotSearch import init_lot_search, search_available, search_lot_ids, lot_match_clause
+from .upgrade import upgrade_schema
 
 def create_admin(app,email,password):
     with app.app_context():
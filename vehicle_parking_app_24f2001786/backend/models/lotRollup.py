@@ -0,0 +1,116 @@
+from models import db
+from datetime import timedelta, timezone
+from flask_restx import fields
+from sqlalchemy.dialects.sqlite import insert
+
+
+def _utc_naive(ts):
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo is not None else ts
+
+
+def hour_bucket(ts):
+    """Truncates a timestamp to the start of its hour, as naive UTC."""
+    return _utc_naive(ts).replace(minute=0, second=0, microsecond=0)
+
+
+# Longest stay spread over hour buckets; anything longer is cut off there
+MAX_STAY_HOURS = 24 * 366
+
+
+def occupied_minutes_by_hour(parked_at, left_at):
+    """Splits a stay into the minutes it occupied in each hour bucket, for at most MAX_STAY_HOURS."""
+    start = _utc_naive(parked_at)
+    end = min(_utc_naive(left_at), hour_bucket(start) + timedelta(hours=MAX_STAY_HOURS))
+    minutes = {}
+    bucket = hour_bucket(start)
+    while bucket < end:
+        next_bucket = bucket + timedelta(hours=1)
+        overlap = (min(end, next_bucket) - max(start, bucket)).total_seconds() / 60
+        if overlap > 0:
+            minutes[bucket] = overlap
+        bucket = next_bucket
+    return minutes
+
+
+class LotHourlyRollup(db.Model):
+    """
+    Per lot and hour totals of bookings, releases, occupied minutes and revenue.
+    Updated incrementally as reservations start and end; rebuilt from the
+    reservation history by the tasks.rebuild_lot_rollups task.
+    Occupied minutes and revenue are added when a reservation ends.
+    """
+    __tablename__ = "lot_hourly_rollups"
+    lot_id = db.Column(db.Integer, db.ForeignKey("parking_lots.id", ondelete="CASCADE"), primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True, index=True) # naive UTC, truncated to the hour
+    bookings = db.Column(db.Integer, default=0, nullable=False)
+    releases = db.Column(db.Integer, default=0, nullable=False)
+    occupied_minutes = db.Column(db.Float, default=0.0, nullable=False)
+    revenue = db.Column(db.Float, default=0.0, nullable=False)
+
+    @classmethod
+    def add(cls, rows):
+        """
+        Adds increments inside the current transaction. `rows` are dicts with
+        lot_id, hour and any of bookings, releases, occupied_minutes, revenue.
+        Done as upserts so concurrent writers don't lose increments.
+        """
+        rows = [
+            {
+                "lot_id": row["lot_id"], "hour": row["hour"],
+                "bookings": row.get("bookings", 0), "releases": row.get("releases", 0),
+                "occupied_minutes": row.get("occupied_minutes", 0.0), "revenue": row.get("revenue", 0.0),
+            }
+            for row in rows
+        ]
+        if not rows:
+            return
+        stmt = insert(cls)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.lot_id, cls.hour],
+            set_={
+                "bookings": cls.bookings + stmt.excluded.bookings,
+                "releases": cls.releases + stmt.excluded.releases,
+                "occupied_minutes": cls.occupied_minutes + stmt.excluded.occupied_minutes,
+                "revenue": cls.revenue + stmt.excluded.revenue,
+            },
+        )
+        db.session.execute(stmt, rows)
+
+    @classmethod
+    def record_booking(cls, lot_id, parked_at):
+        cls.add([{"lot_id": lot_id, "hour": hour_bucket(parked_at), "bookings": 1}])
+
+    @classmethod
+    def release_rows(cls, lot_id, parked_at, left_at, revenue):
+        """Increments for a reservation that ended: the release, its revenue and its occupied minutes."""
+        rows = [
+            {"lot_id": lot_id, "hour": hour, "occupied_minutes": minutes}
+            for hour, minutes in occupied_minutes_by_hour(parked_at, left_at).items()
+        ]
+        rows.append({"lot_id": lot_id, "hour": hour_bucket(left_at), "releases": 1, "revenue": revenue})
+        return rows
+
+    @classmethod
+    def record_release(cls, lot_id, parked_at, left_at, revenue):
+        cls.add(cls.release_rows(lot_id, parked_at, left_at, revenue))
+
+
+def rollup_bucket_model(ns):
+    return ns.model("RollupBucket", {
+        "bucket": fields.DateTime(description="Start of the bucket (UTC)"),
+        "bookings": fields.Integer,
+        "releases": fields.Integer,
+        "occupied_minutes": fields.Float,
+        "revenue": fields.Float,
+    })
+
+
+def rollup_lot_model(ns):
+    return ns.model("RollupLot", {
+        "lot_id": fields.Integer,
+        "prime_location_name": fields.String,
+        "bookings": fields.Integer,
+        "releases": fields.Integer,
+        "occupied_minutes": fields.Float,
+        "revenue": fields.Float,
+    })
@@ -0,0 +1,134 @@
+import re
+from sqlalchemy import text
+from models import db
+
+# --- Full-Text Lot Search (SQLite FTS5) ---
+# parking_lots_fts is an external-content FTS5 index over the searchable lot
+# columns. Triggers keep it in step with every insert, update and delete on
+# parking_lots, and the prefix option keeps short prefix queries on the index.
+
+FTS_TABLE = "parking_lots_fts"
+# bm25 column weights: name, address, city, district, pin code
+RANK = f"bm25({FTS_TABLE}, 10.0, 4.0, 3.0, 2.0, 8.0)"
+
+_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        prime_location_name, address, city, district, pin_code,
+        content='parking_lots', content_rowid='id', prefix='2 3', tokenize='unicode61'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS parking_lots_fts_ai AFTER INSERT ON parking_lots BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, prime_location_name, address, city, district, pin_code)
+        VALUES (new.id, new.prime_location_name, new.address, new.city, new.district, new.pin_code);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS parking_lots_fts_ad AFTER DELETE ON parking_lots BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, prime_location_name, address, city, district, pin_code)
+        VALUES ('delete', old.id, old.prime_location_name, old.address, old.city, old.district, old.pin_code);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS parking_lots_fts_au AFTER UPDATE OF
+        prime_location_name, address, city, district, pin_code ON parking_lots BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, prime_location_name, address, city, district, pin_code)
+        VALUES ('delete', old.id, old.prime_location_name, old.address, old.city, old.district, old.pin_code);
+        INSERT INTO {FTS_TABLE}(rowid, prime_location_name, address, city, district, pin_code)
+        VALUES (new.id, new.prime_location_name, new.address, new.city, new.district, new.pin_code);
+    END
+    """,
+]
+
+# None until checked: processes that did not run init_lot_search look the index up on first use
+_available = None
+
+
+def init_lot_search():
+    """
+    Creates the FTS index and its triggers if missing, and fills the index
+    from parking_lots when it was just created. Must run in an app context.
+    Leaves search on the LIKE fallback when the database has no FTS5.
+    """
+    global _available
+    if db.engine.dialect.name != "sqlite":
+        _available = False
+        return
+    try:
+        existed = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+        ).first() is not None
+        for statement in _DDL:
+            db.session.execute(text(statement))
+        if not existed:
+            db.session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        db.session.commit()
+        _available = True
+    except Exception as e:
+        db.session.rollback()
+        print(f"Full-text lot search unavailable, using LIKE search: {e}")
+        _available = False
+
+
+def search_available():
+    global _available
+    if _available is None:
+        try:
+            _available = db.engine.dialect.name == "sqlite" and db.session.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": FTS_TABLE}
+            ).first() is not None
+        except Exception:
+            db.session.rollback()
+            return False
+    return _available
+
+
+def match_expression(search_query, columns=None):
+    """
+    Turns free text into an FTS5 query matching every word as a prefix, or None.
+    With `columns`, the words must match within those columns.
+    """
+    terms = re.findall(r"\w+", search_query or "")
+    if not terms:
+        return None
+    expression = " ".join(f'"{term}"*' for term in terms)
+    if columns:
+        expression = f"{{{' '.join(columns)}}} : ({expression})"
+    return expression
+
+
+def lot_match_clause(**column_queries):
+    """
+    SQL condition on parking_lots.id for lots whose columns match the given
+    queries, e.g. lot_match_clause(city="mum", address="park st"). Keys are
+    FTS column names; join several with '__' to match the words in any of
+    them. None when there is nothing to match.
+    """
+    parts = []
+    for columns, search_query in column_queries.items():
+        expression = match_expression(search_query, columns.split("__"))
+        if expression:
+            parts.append(f"({expression})")
+    if not parts:
+        return None
+    return text(
+        f"parking_lots.id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :lot_match)"
+    ).bindparams(lot_match=" AND ".join(parts))
+
+
+def search_lot_ids(search_query, offset=0, limit=50, active_only=True):
+    """Ids of the lots matching every word of `search_query` as a prefix, best match first."""
+    expression = match_expression(search_query)
+    if expression is None:
+        return []
+    active = "AND l.is_active = 1" if active_only else ""
+    rows = db.session.execute(
+        text(
+            f"SELECT l.id FROM {FTS_TABLE} JOIN parking_lots AS l ON l.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH :expression {active} "
+            f"ORDER BY {RANK}, l.id LIMIT :limit OFFSET :offset"
+        ),
+        {"expression": expression, "limit": limit, "offset": offset},
+    )
+    return [row[0] for row in rows]
@@ -1,7 +1,6 @@
-from models import db, parking_spot_get_model
+from models import db, parking_spot_get_model, ParkingSpot, SpotStatus
 from datetime import datetime, timezone
 from flask_restx import fields
-from .parkingSpot import SpotStatus
 
 class ParkingLot(db.Model):
     __tablename__ = "parking_lots"
@@ -16,9 +15,15 @@ class ParkingLot(db.Model):
     floor_level = db.Column(db.String(10),default='Ground')
     maximum_number_of_spots = db.Column(db.Integer, nullable=False)
     revenue = db.Column(db.Float, default=0.0)
+    # Denormalized spot counters, kept in step with every spot status change
+    available_count = db.Column(db.Integer, default=0, nullable=False)
+    occupied_count = db.Column(db.Integer, default=0, nullable=False)
     is_active = db.Column(db.Boolean, default=True)
     open_time = db.Column(db.Time)
     close_time = db.Column(db.Time)
+    # WGS84 coordinates of the lot entrance; lots without them are left out of nearby searches
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
     created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(
        db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc),
@@ -32,11 +37,80 @@ class ParkingLot(db.Model):
     )
 
     def available_spots_count(self):
-        return self.parking_spots.filter_by(status=SpotStatus.AVAILABLE).count()
+        return self.available_count
 
     @property
     def occupied_spots(self):
-        return self.parking_spots.filter_by(status=SpotStatus.OCCUPIED).count()
+        return self.occupied_count
+
+    @classmethod
+    def _spots_with(cls, status):
+        """Correlated count of the lot's spots with a status."""
+        return (
+            db.select(db.func.count(ParkingSpot.id))
+            .where(ParkingSpot.lot_id == cls.id, ParkingSpot.status == status)
+            .scalar_subquery()
+        )
+
+    @classmethod
+    def recount(cls):
+        """Recomputes every lot's spot counters from parking_spots with one UPDATE."""
+        db.session.execute(
+            db.update(cls)
+            .values(
+                available_count=cls._spots_with(SpotStatus.AVAILABLE),
+                occupied_count=cls._spots_with(SpotStatus.OCCUPIED),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    @classmethod
+    def drifted_counts(cls):
+        """
+        Lots whose counters disagree with parking_spots, as
+        (id, available_count, occupied_count, actual_available, actual_occupied) rows.
+        """
+        available = cls._spots_with(SpotStatus.AVAILABLE)
+        occupied = cls._spots_with(SpotStatus.OCCUPIED)
+        return db.session.execute(
+            db.select(cls.id, cls.available_count, cls.occupied_count, available, occupied)
+            .where(db.or_(cls.available_count != available, cls.occupied_count != occupied))
+        ).all()
+
+    @classmethod
+    def adjust_counts(cls, lot_id, available=0, occupied=0):
+        """
+        Shifts the spot counters of a lot inside the current transaction.
+        Done as a single UPDATE so concurrent bookings don't lose increments.
+        """
+        db.session.execute(
+            db.update(cls)
+            .where(cls.id == lot_id)
+            .values(
+                available_count=cls.available_count + available,
+                occupied_count=cls.occupied_count + occupied,
+            )
+            .execution_options(synchronize_session="fetch")
+        )
+
+    @property
+    def spots(self):
+        """Spots attached by `preload_spots`, falling back to the dynamic relationship."""
+        preloaded = self.__dict__.get('_preloaded_spots')
+        if preloaded is not None:
+            return preloaded
+        return self.parking_spots.order_by(ParkingSpot.id).all()
+
+    @staticmethod
+    def preload_spots(lots):
+        """Loads the spots of many lots with one IN query instead of one query per lot."""
+        by_lot = {lot.id: [] for lot in lots}
+        if by_lot:
+            for spot in ParkingSpot.query.filter(ParkingSpot.lot_id.in_(by_lot)).order_by(ParkingSpot.id):
+                by_lot[spot.lot_id].append(spot)
+        for lot in lots:
+            lot._preloaded_spots = by_lot[lot.id]
+        return lots
 
     def total_spots_info(self):
         return f"Occupied: {self.occupied_spots}/{self.maximum_number_of_spots}"
@@ -45,8 +119,8 @@ class ParkingLot(db.Model):
         return f"<ParkingLot {self.prime_location_name}>"
 
 
-def parking_lot_get_model(ns):
-    return ns.model("ParkingLotGet", {
+def parking_lot_list_model(ns):
+    return ns.model("ParkingLotList", {
         "id": fields.Integer(required=True, description="ID"),
         "prime_location_name": fields.String(required=True, description="Prime Location Name"),
         "pin_code": fields.String(required=True, description="Pin Code"),
@@ -60,9 +134,16 @@ def parking_lot_get_model(ns):
         "open_time": fields.String(description="Open Time"),
         "close_time": fields.String(description="Close Time"),
         "is_active": fields.Boolean(description="Is Active"),
+        "latitude": fields.Float(description="Latitude"),
+        "longitude": fields.Float(description="Longitude"),
         "revenue": fields.Float(description="Revenue"),
         "occupied_spots": fields.Integer(description="Occupied Spot"),
-        "parking_spots": fields.List(fields.Nested(parking_spot_get_model(ns)), description="Parking Spots"),
+        "available_spots": fields.Integer(attribute="available_count", description="Available Spots"),
+    })
+
+def parking_lot_get_model(ns):
+    return ns.inherit("ParkingLotGet", parking_lot_list_model(ns), {
+        "parking_spots": fields.List(fields.Nested(parking_spot_get_model(ns)), attribute="spots", description="Parking Spots"),
     })
 
 def parking_lot_post_model(ns):
@@ -77,6 +158,8 @@ def parking_lot_post_model(ns):
         "maximum_number_of_spots": fields.Integer(required=True, description="Maximum Number of Spots"),
         "open_time": fields.String(description="Open Time"),
         "close_time": fields.String(description="Close Time"),
+        "latitude": fields.Float(description="Latitude"),
+        "longitude": fields.Float(description="Longitude"),
     })
 
 def parking_lot_put_model(ns):
@@ -85,4 +168,6 @@ def parking_lot_put_model(ns):
     'maximum_number_of_spots': fields.Integer(required=False),
     'open_time': fields.String(required=False),
     'close_time': fields.String(required=False),
+    'latitude': fields.Float(required=False),
+    'longitude': fields.Float(required=False),
 })
\ No newline at end of file
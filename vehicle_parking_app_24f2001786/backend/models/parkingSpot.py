@@ -1,3 +1,4 @@
+import re
 from models import db, EnumField
 from datetime import datetime, timezone
 from flask_restx import fields
@@ -9,10 +10,19 @@ class SpotStatus(enum.Enum):
 
 
 
+# Rows per executemany batch when provisioning spots in bulk
+SPOT_INSERT_BATCH_SIZE = 1000
+
+
 class ParkingSpot(db.Model):
     __tablename__ = "parking_spots"
+    __table_args__ = (
+        db.Index("ix_parking_spots_lot_id_status", "lot_id", "status"),
+        db.Index("ix_parking_spots_lot_id_spot_index", "lot_id", "spot_index", unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     spot_number = db.Column(db.String(20), nullable=False)
+    spot_index = db.Column(db.Integer, nullable=False)
     lot_id = db.Column(db.Integer, db.ForeignKey("parking_lots.id"), nullable=False)
     status = db.Column(
         db.Enum(SpotStatus), default=SpotStatus.AVAILABLE, nullable=False
@@ -31,6 +41,151 @@ class ParkingSpot(db.Model):
         cascade="save-update",
     )
 
+    @classmethod
+    def bulk_provision(cls, lot_id, indexes, batch_size=SPOT_INSERT_BATCH_SIZE):
+        """
+        Inserts available spots for the given indexes of a lot using batched
+        executemany INSERTs instead of one ORM object per spot.
+        Returns the number of spots inserted.
+        """
+        now = datetime.now(timezone.utc)
+        insert = cls.__table__.insert()
+        inserted = 0
+        batch = []
+        for index in indexes:
+            batch.append({
+                "lot_id": lot_id,
+                "spot_index": index,
+                "spot_number": f"{lot_id}-{index}",
+                "status": SpotStatus.AVAILABLE,
+                "revenue": 0.0,
+                "created_at": now,
+                "updated_at": now,
+            })
+            if len(batch) >= batch_size:
+                db.session.execute(insert, batch)
+                inserted += len(batch)
+                batch = []
+        if batch:
+            db.session.execute(insert, batch)
+            inserted += len(batch)
+        return inserted
+
+    @classmethod
+    def provision_range(cls, lot_id, start, stop):
+        """
+        Inserts available spots for indexes start..stop (inclusive) of a lot with a
+        single INSERT ... SELECT over a recursive series, so no row data crosses
+        from Python to the database. Returns the number of spots inserted.
+        """
+        if stop < start:
+            return 0
+        now = datetime.now(timezone.utc)
+        series = db.select(db.literal(start).label("i")).cte("series", recursive=True)
+        series = series.union_all(db.select(series.c.i + 1).where(series.c.i < stop))
+        rows = db.select(
+            db.literal(lot_id),
+            series.c.i,
+            db.literal(f"{lot_id}-") + db.cast(series.c.i, db.String),
+            db.literal(SpotStatus.AVAILABLE, cls.status.type),
+            db.literal(0.0),
+            db.literal(now, cls.created_at.type),
+            db.literal(now, cls.updated_at.type),
+        )
+        db.session.execute(
+            cls.__table__.insert().from_select(
+                ["lot_id", "spot_index", "spot_number", "status", "revenue", "created_at", "updated_at"], rows
+            )
+        )
+        return stop - start + 1
+
+    @classmethod
+    def backfill_indexes(cls):
+        """
+        Sets spot_index on spots created before the column existed, from their
+        "<lot>-<index>" spot number. Spots whose number does not parse, or whose
+        index is already taken in their lot, get the lot's next free index and a
+        matching spot number. Returns the number of spots updated.
+        """
+        missing = (
+            db.session.query(cls.id, cls.lot_id, cls.spot_number)
+            .filter(cls.spot_index.is_(None))
+            .order_by(cls.lot_id, cls.id)
+            .all()
+        )
+        if not missing:
+            return 0
+        taken = {}
+        for lot_id, index in db.session.query(cls.lot_id, cls.spot_index).filter(cls.spot_index.isnot(None)):
+            taken.setdefault(lot_id, set()).add(index)
+
+        updates, leftovers = [], []
+        for spot_id, lot_id, spot_number in missing:
+            used = taken.setdefault(lot_id, set())
+            match = re.fullmatch(r"\d+-(\d+)", spot_number or "")
+            if match and int(match.group(1)) not in used:
+                index = int(match.group(1))
+                used.add(index)
+                updates.append({"spot_id": spot_id, "index": index, "number": None})
+            else:
+                leftovers.append((spot_id, lot_id))
+        for spot_id, lot_id in leftovers:
+            used = taken[lot_id]
+            index = max(used, default=0) + 1
+            used.add(index)
+            updates.append({"spot_id": spot_id, "index": index, "number": f"{lot_id}-{index}"})
+
+        table = cls.__table__
+        db.session.execute(
+            db.update(table)
+            .where(table.c.id == db.bindparam("spot_id"))
+            .values(
+                spot_index=db.bindparam("index"),
+                spot_number=db.func.coalesce(db.bindparam("number"), table.c.spot_number),
+            ),
+            updates,
+        )
+        return len(updates)
+
+    @classmethod
+    def lowest_available(cls, lot_id):
+        """(index, spot_id) of the lowest free spot of a lot, read from the database, or None."""
+        row = (
+            db.session.query(cls.spot_index, cls.id)
+            .filter(cls.lot_id == lot_id, cls.status == SpotStatus.AVAILABLE)
+            .order_by(cls.spot_index)
+            .first()
+        )
+        return tuple(row) if row else None
+
+    @classmethod
+    def try_occupy(cls, spot_id):
+        """
+        Atomically flips a spot from AVAILABLE to OCCUPIED.
+        Returns False if the spot was already taken by a concurrent booking.
+        """
+        result = db.session.execute(
+            db.update(cls)
+            .where(cls.id == spot_id, cls.status == SpotStatus.AVAILABLE)
+            .values(status=SpotStatus.OCCUPIED)
+            .execution_options(synchronize_session="fetch")
+        )
+        return result.rowcount == 1
+
+    @classmethod
+    def try_release(cls, spot_id):
+        """
+        Atomically flips a spot from OCCUPIED back to AVAILABLE.
+        Returns False if the spot was not occupied.
+        """
+        result = db.session.execute(
+            db.update(cls)
+            .where(cls.id == spot_id, cls.status == SpotStatus.OCCUPIED)
+            .values(status=SpotStatus.AVAILABLE)
+            .execution_options(synchronize_session="fetch")
+        )
+        return result.rowcount == 1
+
     def __repr__(self):
         return f"<ParkingSpot {self.spot_number} in Lot {self.lot_id}>"
     
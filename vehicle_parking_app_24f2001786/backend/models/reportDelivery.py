@@ -0,0 +1,19 @@
+from models import db
+from datetime import datetime, timezone
+
+
+class ReportDelivery(db.Model):
+    """Checkpoint of a monthly report sent to a user, so reruns skip them."""
+    __tablename__ = "report_deliveries"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "period", name="uq_report_deliveries_user_period"),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(
+        db.String(50), db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    period = db.Column(db.String(7), nullable=False, index=True) # YYYY-MM
+    sent_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<ReportDelivery User={self.user_id} Period={self.period}>"
@@ -11,6 +11,9 @@ class ReservationStatus(enum.Enum):
 
 class ReservedParkingSpot(db.Model):
     __tablename__ = "reserved_parking_spots"
+    __table_args__ = (
+        db.Index("ix_reserved_parking_spots_user_id_parking_timestamp", "user_id", "parking_timestamp"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     spot_id = db.Column(
         db.Integer,
@@ -38,6 +41,20 @@ class ReservedParkingSpot(db.Model):
     vehicle = db.relationship("Vehicle", back_populates="reservations", uselist=False)
     payment = db.relationship("Payment", back_populates="reservation", uselist=False)
 
+    @classmethod
+    def try_complete(cls, reservation_id, leaving_timestamp):
+        """
+        Atomically flips a reservation from ACTIVE to COMPLETED.
+        Returns False if it was already completed, e.g. by a concurrent request.
+        """
+        result = db.session.execute(
+            db.update(cls)
+            .where(cls.id == reservation_id, cls.status == ReservationStatus.ACTIVE)
+            .values(status=ReservationStatus.COMPLETED, leaving_timestamp=leaving_timestamp)
+            .execution_options(synchronize_session="fetch")
+        )
+        return result.rowcount == 1
+
     def __repr__(self):
         return f"<Reservation ID={self.id} Spot={self.spot_id} User={self.user_id}>"
     
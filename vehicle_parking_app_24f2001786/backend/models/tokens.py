@@ -7,11 +7,19 @@ class TokenBlocklist(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
     @classmethod
-    def cleanup_blocklist(cls, days: int = 1):
-        """Delete tokens older than `days` (default 1 day)."""
+    def cleanup_blocklist(cls, days: int = 1, batch_size: int = 1000):
+        """
+        Delete tokens older than `days` (default 1 day), `batch_size` rows per
+        transaction so the table is never locked for one unbounded DELETE.
+        """
         expiration_time = datetime.now(timezone.utc) - timedelta(days=days)
-        deleted = cls.query.filter(cls.created_at < expiration_time).delete()
-        db.session.commit()
+        deleted = 0
+        while True:
+            ids = [row.id for row in db.session.query(cls.id).filter(cls.created_at < expiration_time).limit(batch_size)]
+            if not ids:
+                break
+            deleted += cls.query.filter(cls.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
         return deleted
 
     def __repr__(self):
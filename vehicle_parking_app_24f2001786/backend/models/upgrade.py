@@ -0,0 +1,74 @@
+from sqlalchemy import inspect, text
+from models import db
+
+# --- In-Place Schema Upgrade ---
+# db.create_all only creates missing tables, so a database created before a
+# model gained a column is brought up to date here: missing columns are added
+# with ALTER TABLE, derived columns are backfilled, and then missing indexes
+# are created. Runs from `flask --app app init-db` and is safe to repeat.
+
+
+def _column_ddl(column, dialect):
+    """Column definition for ALTER TABLE ... ADD COLUMN."""
+    ddl = f"{column.name} {column.type.compile(dialect=dialect)}"
+    default = column.default
+    if default is not None and default.is_scalar and default.arg is not None:
+        literal = db.literal(default.arg, column.type).compile(dialect=dialect, compile_kwargs={"literal_binds": True})
+        ddl += f" DEFAULT {literal}"
+        # SQLite only accepts NOT NULL on an added column when it has a default
+        if not column.nullable:
+            ddl += " NOT NULL"
+    return ddl
+
+
+def add_missing_columns():
+    """Adds the model columns that existing tables lack. Returns their names."""
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    added = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        present = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in present:
+                db.session.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {_column_ddl(column, db.engine.dialect)}"))
+                added.append(f"{table.name}.{column.name}")
+    db.session.commit()
+    return added
+
+
+def create_missing_indexes():
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+
+def upgrade_schema():
+    """
+    Brings an existing database up to the current models. Must run in an app
+    context, after db.create_all().
+    """
+    from models import ParkingLot, ParkingSpot, User, Vehicle
+
+    added = add_missing_columns()
+    for name in added:
+        print(f"Added column {name}")
+
+    backfills = [
+        ("spot_index", "parking spot", ParkingSpot.backfill_indexes),
+        ("username_key", "user", User.backfill_username_keys),
+        ("number_key", "vehicle", Vehicle.backfill_number_keys),
+    ]
+    for column, noun, backfill in backfills:
+        count = backfill()
+        if count:
+            print(f"Backfilled {column} for {count} {noun}(s)")
+    if "parking_lots.available_count" in added or "parking_lots.occupied_count" in added:
+        # The counters were added as 0; derive them from the spots once
+        ParkingLot.recount()
+        print("Recounted available and occupied spots of every parking lot")
+    db.session.commit()
+
+    # After the backfill, so unique indexes are built over complete data
+    create_missing_indexes()
@@ -1,4 +1,5 @@
 from models import db, EnumField
+from sqlalchemy.orm import validates
 from flask_restx import fields
 import enum
 import uuid
@@ -16,13 +17,15 @@ class User(db.Model):
 
     id = db.Column(BLOB, primary_key=True, default=lambda: uuid.uuid4().bytes)
     username = db.Column(db.String(80), unique=True, nullable=False)
+    # Lower-cased username, so case-insensitive prefix searches can use an index
+    username_key = db.Column(db.String(80), index=True)
     full_name = db.Column(db.String(120), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(128), nullable=False)
     role = db.Column(db.Enum(UserRole), default=UserRole.USER, nullable=False)
     phone_number = db.Column(db.String(20), unique=True, nullable=False)
     address = db.Column(db.String(200), nullable=False)
-    pincode = db.Column(db.String(6), nullable=False)
+    pincode = db.Column(db.String(6), nullable=False, index=True)
     created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
@@ -35,6 +38,27 @@ class User(db.Model):
     vehicles = db.relationship(
         "Vehicle", back_populates="user", cascade="all, delete-orphan"
     )
+    @validates("username")
+    def _set_username_key(self, key, username):
+        self.username_key = username.lower() if username else username
+        return username
+
+    @classmethod
+    def backfill_username_keys(cls):
+        """Sets username_key on users written before the column existed. Returns the number updated."""
+        table = cls.__table__
+        updates = [
+            {"user_id": user_id, "key": username.lower()}
+            for user_id, username in db.session.query(cls.id, cls.username).filter(cls.username_key.is_(None))
+            if username
+        ]
+        if updates:
+            db.session.execute(
+                db.update(table).where(table.c.id == db.bindparam("user_id")).values(username_key=db.bindparam("key")),
+                updates,
+            )
+        return len(updates)
+
     # Password handling
     @property
     def password(self):
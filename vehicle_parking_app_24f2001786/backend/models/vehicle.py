@@ -1,10 +1,14 @@
+import re
 from models import db, display_user_model
+from sqlalchemy.orm import validates
 from datetime import datetime, timezone
 from flask_restx import fields
 
 class Vehicle(db.Model):
     __tablename__ = "vehicles"
     vehicle_number = db.Column(db.String(20), primary_key=True)
+    # Upper-cased vehicle number without spaces or dashes, for indexed prefix searches
+    number_key = db.Column(db.String(20), index=True)
     user_id = db.Column(
         db.String(50), db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False
     )
@@ -23,6 +27,32 @@ class Vehicle(db.Model):
         "ReservedParkingSpot", back_populates="vehicle", cascade="all, delete-orphan"
     )
 
+    @staticmethod
+    def normalize_number(vehicle_number):
+        return re.sub(r"[^0-9A-Za-z]", "", vehicle_number or "").upper()
+
+    @validates("vehicle_number")
+    def _set_number_key(self, key, vehicle_number):
+        self.number_key = Vehicle.normalize_number(vehicle_number)
+        return vehicle_number
+
+    @classmethod
+    def backfill_number_keys(cls):
+        """Sets number_key on vehicles written before the column existed. Returns the number updated."""
+        table = cls.__table__
+        updates = [
+            {"number": number, "key": cls.normalize_number(number)}
+            for (number,) in db.session.query(cls.vehicle_number).filter(cls.number_key.is_(None))
+        ]
+        if updates:
+            db.session.execute(
+                db.update(table)
+                .where(table.c.vehicle_number == db.bindparam("number"))
+                .values(number_key=db.bindparam("key")),
+                updates,
+            )
+        return len(updates)
+
     def __repr__(self):
         return f"<Vehicle {self.vehicle_number}>"
 
@@ -0,0 +1,113 @@
+# Report Rendering
+
+import os
+import logging
+from threading import Lock
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, select_autoescape
+from config import LocalDevelopmentConfig
+
+try:
+    from weasyprint import HTML, CSS
+    from weasyprint.text.fonts import FontConfiguration
+except (ImportError, OSError):
+    HTML = CSS = FontConfiguration = None
+
+# Load configuration
+config = LocalDevelopmentConfig()
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+
+def _bytecode_cache():
+    try:
+        os.makedirs(config.TEMPLATE_CACHE_DIR, exist_ok=True)
+        return FileSystemBytecodeCache(config.TEMPLATE_CACHE_DIR)
+    except OSError as e:
+        logger.warning(f"Template bytecode cache disabled: {e}")
+        return None
+
+
+# One environment per worker process: each template is compiled once and kept
+# in the environment's cache, and its bytecode is shared with later processes.
+env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(["html"]),
+    bytecode_cache=_bytecode_cache(),
+    auto_reload=False,
+)
+
+
+class PdfRenderer:
+    """
+    Renders HTML documents to PDF, reusing one FontConfiguration and the parsed
+    stylesheets across documents instead of re-parsing them for every PDF.
+    """
+
+    def __init__(self):
+        self._font_config = None
+        self._stylesheets = {}
+        self._lock = Lock()
+
+    @property
+    def available(self):
+        return HTML is not None
+
+    def stylesheet(self, name):
+        """Returns the parsed WeasyPrint CSS for a file in the templates folder."""
+        css = self._stylesheets.get(name)
+        if css is None:
+            with self._lock:
+                if self._font_config is None:
+                    self._font_config = FontConfiguration()
+                css = self._stylesheets.get(name)
+                if css is None:
+                    css = CSS(filename=os.path.join(TEMPLATE_DIR, name), font_config=self._font_config)
+                    self._stylesheets[name] = css
+        return css
+
+    def write_pdf(self, html, stylesheet):
+        """Renders an HTML string with a cached stylesheet and returns the PDF bytes."""
+        css = self.stylesheet(stylesheet)
+        return HTML(string=html, base_url=TEMPLATE_DIR).write_pdf(
+            stylesheets=[css], font_config=self._font_config
+        )
+
+
+pdf_renderer = PdfRenderer()
+_stylesheet_sources = {}
+
+
+def stylesheet_source(name):
+    """Returns the raw text of a stylesheet, for inlining into email bodies."""
+    source = _stylesheet_sources.get(name)
+    if source is None:
+        with open(os.path.join(TEMPLATE_DIR, name), encoding="utf-8") as f:
+            source = _stylesheet_sources[name] = f.read()
+    return source
+
+
+def render_template(name, **context):
+    """Renders a template from the templates folder."""
+    return env.get_template(name).render(**context)
+
+
+def render_monthly_report(insight, month_name):
+    """
+    Renders a user's monthly report and returns (email_html, pdf_bytes).
+    The email body carries the stylesheet inline; the PDF uses the pre-parsed one.
+    """
+    context = dict(
+        username=insight['username'],
+        month_name=month_name,
+        total_bookings=insight['total_bookings'],
+        total_spent=insight['total_spent'],
+        most_used_lot_name=insight['most_used_lot_name'],
+        peak_day=insight['peak_day'],
+        avg_duration=insight['avg_duration'],
+    )
+    template = env.get_template("monthly_report.html")
+    email_html = template.render(inline_css=stylesheet_source("monthly_report.css"), **context)
+    pdf_data = pdf_renderer.write_pdf(template.render(**context), "monthly_report.css")
+    return email_html, pdf_data
@@ -0,0 +1,164 @@
+# Token Revocation Store
+
+import hashlib
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from threading import Lock, Thread
+from models import db, TokenBlocklist
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings: no false negatives, tunable false positives."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class SQLRevocationStore:
+    """Revoked JTIs in the token_blocklist table."""
+
+    def revoke(self, jti, expires_at):
+        db.session.add(TokenBlocklist(jti=jti))
+        db.session.commit()
+
+    def is_revoked(self, jti):
+        return db.session.query(TokenBlocklist.id).filter_by(jti=jti).first() is not None
+
+
+class RedisRevocationStore:
+    """
+    Revoked JTIs in a Redis sorted set scored by token expiry, so each entry
+    lives exactly as long as the token it revokes. An in-process Bloom filter
+    answers the common "not revoked" case without a network call; it is
+    rebuilt from Redis in a background thread once it is older than
+    `refresh_interval` seconds, so revocations made by other workers are
+    picked up without a request ever waiting for the download. Writes also go
+    to the SQL table, which answers lookups for `retry_after` seconds after
+    Redis fails instead of every request trying Redis again.
+    """
+
+    KEY = "revoked_jtis"
+
+    def __init__(self, client, capacity=100000, refresh_interval=5, retry_after=30):
+        self.client = client
+        self.capacity = capacity
+        self.refresh_interval = refresh_interval
+        self.retry_after = retry_after
+        self.fallback = SQLRevocationStore()
+        self._bloom = None
+        self._refreshed_at = float("-inf")
+        self._refreshing = False
+        # JTIs revoked here while a rebuild is downloading, re-added to the new filter
+        self._revoked_during_refresh = []
+        self._down_until = float("-inf")
+        self._lock = Lock()
+
+    def _mark_down(self):
+        self._down_until = time.monotonic() + self.retry_after
+
+    def _refresh_bloom(self):
+        try:
+            bloom = BloomFilter(self.capacity)
+            for jti in self.client.zrangebyscore(self.KEY, time.time(), "+inf"):
+                bloom.add(jti.decode() if isinstance(jti, bytes) else jti)
+            with self._lock:
+                for jti in self._revoked_during_refresh:
+                    bloom.add(jti)
+                self._bloom = bloom
+                self._refreshed_at = time.monotonic()
+        except Exception as e:
+            logger.error(f"Revocation Bloom filter refresh failed: {e}")
+            self._mark_down()
+        finally:
+            with self._lock:
+                self._refreshing = False
+                self._revoked_during_refresh = []
+
+    def _maybe_refresh(self):
+        """Starts a background rebuild when the filter is stale. Never blocks the caller."""
+        with self._lock:
+            if self._refreshing or time.monotonic() - self._refreshed_at <= self.refresh_interval:
+                return
+            self._refreshing = True
+        Thread(target=self._refresh_bloom, name="revocation-bloom", daemon=True).start()
+
+    def revoke(self, jti, expires_at):
+        self.fallback.revoke(jti, expires_at)
+        try:
+            pipe = self.client.pipeline()
+            pipe.zadd(self.KEY, {jti: expires_at})
+            pipe.zremrangebyscore(self.KEY, "-inf", time.time())
+            pipe.execute()
+            with self._lock:
+                if self._bloom is not None:
+                    self._bloom.add(jti)
+                if self._refreshing:
+                    self._revoked_during_refresh.append(jti)
+        except Exception as e:
+            logger.error(f"Redis revocation write failed, kept in SQL only: {e}")
+
+    def is_revoked(self, jti):
+        if time.monotonic() < self._down_until:
+            return self.fallback.is_revoked(jti)
+        try:
+            self._maybe_refresh()
+            bloom = self._bloom
+            # Until the first rebuild lands, every lookup asks Redis directly
+            if bloom is not None and jti not in bloom:
+                return False
+            score = self.client.zscore(self.KEY, jti)
+            return score is not None and score > time.time()
+        except Exception as e:
+            logger.error(f"Redis revocation lookup failed, using SQL for {self.retry_after}s: {e}")
+            self._mark_down()
+            return self.fallback.is_revoked(jti)
+
+
+class TokenRevocation:
+    """Selects the revocation backend from TOKEN_REVOCATION_BACKEND ('redis' or 'sql')."""
+
+    def __init__(self):
+        self.store = SQLRevocationStore()
+
+    def init_app(self, app):
+        if app.config.get("TOKEN_REVOCATION_BACKEND") == "redis":
+            import redis
+            client = redis.Redis.from_url(app.config["TOKEN_REVOCATION_REDIS_URL"])
+            self.store = RedisRevocationStore(
+                client,
+                capacity=app.config.get("TOKEN_REVOCATION_BLOOM_CAPACITY", 100000),
+                refresh_interval=app.config.get("TOKEN_REVOCATION_BLOOM_REFRESH", 5),
+                retry_after=app.config.get("TOKEN_REVOCATION_REDIS_RETRY", 30),
+            )
+        else:
+            self.store = SQLRevocationStore()
+
+    def revoke(self, jti, exp=None):
+        """Revokes a token until its `exp` (epoch seconds); defaults to one day."""
+        expires_at = exp or datetime.now(timezone.utc).timestamp() + 86400
+        self.store.revoke(jti, expires_at)
+
+    def is_revoked(self, jti):
+        return self.store.is_revoked(jti)
+
+
+revocation = TokenRevocation()
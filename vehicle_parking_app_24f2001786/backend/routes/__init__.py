@@ -24,6 +24,10 @@ api = Api(version='1.0',
 def register_blueprints(app):
         cache.init_app(app)
 
+        if app.config.get("FAST_JSON"):
+            from serializers import output_json
+            api.representations['application/json'] = output_json
+
         from routes.auth import auth_ns    
         from routes.user import user_ns
         from routes.admin import admin_ns
@@ -1,19 +1,35 @@
-from flask import request
+from flask import request, Response, send_file
 from flask_restx import Resource, Namespace, abort, fields
-from flask_jwt_extended import jwt_required, current_user
+from flask_jwt_extended import jwt_required, current_user, get_jwt
 from models import (
     db,
-    ParkingLot,parking_lot_get_model, parking_lot_put_model,
-    ParkingSpot, SpotStatus, parking_lot_post_model,
+    ParkingLot,parking_lot_get_model, parking_lot_list_model, parking_lot_put_model,
+    ParkingSpot, SpotStatus, parking_lot_post_model, parking_spot_get_model,
     ReservedParkingSpot,reservation_get_model,ReservationStatus,
     User, Vehicle,display_user_model, vehicle_model,
-    Payment, PaymentStatus
+    Payment, PaymentStatus,
+    LotHourlyRollup, rollup_bucket_model, rollup_lot_model,
+    search_available, lot_match_clause
     )
 from functools import wraps
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from werkzeug.exceptions import HTTPException
+import os
 import uuid
-from routes import cache # Import the cache object
+from routes import cache_tags
+from allocator import allocator
+from geoindex import geo_index
+from events import spot_events, REMOVED
+from serializers import serialize
+from task_queue import task_queue
+from export_links import resolve_export
+from routes.pagination import (
+    NEXT_CURSOR_HEADER, MAX_PER_PAGE, PAGE_PARAMS,
+    page_args, wants_spots, keyset_page, page_number_args, numbered_page,
+)
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload
+from models.lotRollup import hour_bucket
 
 # --- Setup ---
 admin_ns = Namespace('admin', description='Admin related operations for managing parking lots')
@@ -24,12 +40,21 @@ def admin_required(f):
     @wraps(f)
     @jwt_required()
     def wrapper(*args, **kwargs):
-        if not hasattr(current_user, 'role_value') or current_user.role_value != 'admin':
+        # Prefer the role claim; older tokens without it fall back to the user record.
+        role = get_jwt().get('role') or getattr(current_user, 'role_value', None)
+        if role != 'admin':
             abort(403, 'Forbidden: Administrator access required.')
         return f(*args, **kwargs)
     return wrapper
 
 # --- Helper Functions ---
+def prefix_filter(column, prefix):
+    """
+    `column LIKE 'prefix%'` written as a range, so it can use the column's index
+    (SQLite only does so for LIKE under case-sensitive collations).
+    """
+    return and_(column >= prefix, column < prefix + '\U0010ffff')
+
 def parse_time(time_str: str):
     """
     Parses a time string from multiple possible formats (HH:MM:SS or HH:MM)
@@ -44,13 +69,30 @@ def parse_time(time_str: str):
             continue
     abort(400, f"Invalid time format for '{time_str}'. Please use HH:MM or HH:MM:SS format.")
 
+def parse_coordinates(data, latitude=None, longitude=None):
+    """
+    Reads optional latitude/longitude from a request payload, falling back to the
+    given current values. Both must be set together and lie in the WGS84 range.
+    """
+    latitude = data.get('latitude', latitude)
+    longitude = data.get('longitude', longitude)
+    if (latitude is None) != (longitude is None):
+        abort(400, "Latitude and longitude must be provided together.")
+    if latitude is not None and not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        abort(400, "Latitude must be between -90 and 90 and longitude between -180 and 180.")
+    return latitude, longitude
+
 # --- Models for Swagger Documentation ---
 parking_lot_get_model = parking_lot_get_model(admin_ns)
+parking_lot_list_model = parking_lot_list_model(admin_ns)
+parking_spot_get_model = parking_spot_get_model(admin_ns)
 parking_lot_post_model = parking_lot_post_model(admin_ns)
 parking_lot_put_model = parking_lot_put_model(admin_ns)
 reservation_get_model = reservation_get_model(admin_ns)
 display_user_model = display_user_model(admin_ns)
 vehicle_model = vehicle_model(admin_ns)
+rollup_bucket_model = rollup_bucket_model(admin_ns)
+rollup_lot_model = rollup_lot_model(admin_ns)
 
 # New model for the payment summary
 payment_summary_model = admin_ns.model('PaymentSummary', {
@@ -58,9 +100,35 @@ payment_summary_model = admin_ns.model('PaymentSummary', {
     'pending': fields.Integer(description='Total number of pending transactions')
 })
 
+# Numbered search result pages
+def search_page_model(name, item_model):
+    return admin_ns.model(name, {
+        'items': fields.List(fields.Nested(item_model)),
+        'total': fields.Integer(description='Number of matches across all pages'),
+        'page': fields.Integer,
+        'per_page': fields.Integer,
+    })
+
+search_page_models = {
+    'lot': search_page_model('LotSearchPage', parking_lot_get_model),
+    'user': search_page_model('UserSearchPage', display_user_model),
+    'vehicle': search_page_model('VehicleSearchPage', vehicle_model),
+}
+
+# Slim per-lot figures for the summary charts
+summary_lot_model = admin_ns.model('SummaryLot', {
+    'id': fields.Integer,
+    'prime_location_name': fields.String,
+    'price_per_hour': fields.Float,
+    'maximum_number_of_spots': fields.Integer,
+    'revenue': fields.Float,
+    'occupied_spots': fields.Integer,
+    'available_spots': fields.Integer,
+})
+
 # New model for the combined summary response
 summary_response_model = admin_ns.model('SummaryResponse', {
-    'lots': fields.List(fields.Nested(parking_lot_get_model)),
+    'lots': fields.List(fields.Nested(summary_lot_model)),
     'payment_summary': fields.Nested(payment_summary_model)
 })
 
@@ -68,9 +136,25 @@ summary_response_model = admin_ns.model('SummaryResponse', {
 # --- Service Layer for Business Logic ---
 class AdminServices:
     @staticmethod
-    def get_all_lots():
-        """Fetches all parking lots from the database."""
-        return ParkingLot.query.order_by(ParkingLot.prime_location_name).all()
+    def get_all_lots(cursor=None, limit=None, include_spots=False):
+        """Fetches one page of parking lots ordered by name, optionally with their spots."""
+        lots, next_cursor = keyset_page(
+            ParkingLot.query, [ParkingLot.prime_location_name, ParkingLot.id], cursor, limit
+        )
+        if include_spots:
+            ParkingLot.preload_spots(lots)
+        return lots, next_cursor
+
+    @staticmethod
+    def get_lot_spots(lot_id, status=None, cursor=None, limit=None):
+        """Fetches one page of a lot's spots, optionally filtered by status."""
+        query = ParkingSpot.query.filter(ParkingSpot.lot_id == lot_id)
+        if status:
+            try:
+                query = query.filter(ParkingSpot.status == SpotStatus(status))
+            except ValueError:
+                abort(400, f"Invalid spot status '{status}'.")
+        return keyset_page(query, [ParkingSpot.id], cursor, limit)
 
     @staticmethod
     def get_lot_by_id(lot_id):
@@ -80,6 +164,7 @@ class AdminServices:
     @staticmethod
     def create_lot(data):
         """Creates a new parking lot and its associated spots."""
+        latitude, longitude = parse_coordinates(data)
         try:
             new_lot = ParkingLot(
                 prime_location_name=data['prime_location_name'],
@@ -91,18 +176,20 @@ class AdminServices:
                 price_per_hour=data['price_per_hour'],
                 floor_level=data.get('floor_level', 'Ground'),
                 maximum_number_of_spots=data['maximum_number_of_spots'],
+                available_count=data['maximum_number_of_spots'],
                 open_time=parse_time(data.get('open_time')),
                 close_time=parse_time(data.get('close_time')),
+                latitude=latitude,
+                longitude=longitude,
             )
             db.session.add(new_lot)
             db.session.flush()
 
-            for i in range(1, new_lot.maximum_number_of_spots + 1):
-                spot = ParkingSpot(spot_number=f"{new_lot.id}-{i}", lot_id=new_lot.id)
-                db.session.add(spot)
-            
+            ParkingSpot.provision_range(new_lot.id, 1, new_lot.maximum_number_of_spots)
             db.session.commit()
-            cache.clear() # Clear cache after creating a lot
+            allocator.invalidate(new_lot.id)
+            geo_index.update(new_lot)
+            cache_tags.invalidate('lots:list', f'lot:{new_lot.id}')
             return new_lot
         except HTTPException:
             raise
@@ -122,28 +209,22 @@ class AdminServices:
             if new_spots < occupied_count:
                 abort(400, f"Cannot reduce spots to {new_spots}. At least {occupied_count} spots are currently occupied.")
 
-            if new_spots < current_spots:
-                spots_to_delete = lot.parking_spots.filter_by(status=SpotStatus.AVAILABLE).order_by(ParkingSpot.id.desc()).limit(current_spots - new_spots)
-                for spot in spots_to_delete:
-                    db.session.delete(spot)
-            elif new_spots > current_spots:
-                ava_spot_num = [int(spot.spot_number.split('-')[1])
-                                 for spot in lot.parking_spots]
-               
-                for i in range(1, new_spots + 1):
-                    if i in ava_spot_num:
-                        continue
-                    
-                    spot = ParkingSpot(spot_number=f"{lot.id}-{i}", lot_id=lot.id)
-                    db.session.add(spot)
+            changes = AdminServices.resize_spots(lot, current_spots, new_spots)
             
             lot.price_per_hour = data['price_per_hour']
             lot.maximum_number_of_spots = new_spots
             lot.open_time = parse_time(data.get('open_time'))
             lot.close_time = parse_time(data.get('close_time'))
+            lot.latitude, lot.longitude = parse_coordinates(data, lot.latitude, lot.longitude)
             
             db.session.commit()
-            cache.clear() # Clear cache after updating a lot
+            allocator.invalidate(lot.id)
+            geo_index.update(lot)
+            tags = ['lots:list', f'lot:{lot.id}']
+            if changes:
+                tags.extend(cache_tags.spot_tags(lot.id))
+            cache_tags.invalidate(*tags)
+            spot_events.publish(lot.id, changes)
             return lot
         except HTTPException:
             raise
@@ -152,6 +233,62 @@ class AdminServices:
             print(f"Error updating parking lot {lot.id}: {e}")
             abort(500, "An internal error occurred while updating the parking lot.")
 
+    @staticmethod
+    def resize_spots(lot, current_spots, new_spots):
+        """
+        Grows or shrinks a lot's spots with a single bulk INSERT or DELETE.
+        Missing and surplus spots are worked out on the integer spot_index column,
+        so the cost is linear in the lot size rather than quadratic.
+        Returns the (spot_id, status) changes for the live spot stream.
+        """
+        if new_spots > current_spots:
+            count, top = db.session.query(
+                db.func.count(ParkingSpot.spot_index), db.func.max(ParkingSpot.spot_index)
+            ).filter(ParkingSpot.lot_id == lot.id).one()
+            top = top or 0
+            needed = max(new_spots - count, 0)
+            gaps = []
+            if count < top:
+                # Only lots with deleted spots have holes below the highest index;
+                # refill the lowest ones first, but never more than are needed.
+                existing = {
+                    index for (index,) in db.session.query(ParkingSpot.spot_index).filter(ParkingSpot.lot_id == lot.id)
+                }
+                gaps = [i for i in range(1, top + 1) if i not in existing][:needed]
+            added = ParkingSpot.bulk_provision(lot.id, gaps)
+            added += ParkingSpot.provision_range(lot.id, top + 1, top + needed - len(gaps))
+            ParkingLot.adjust_counts(lot.id, available=added)
+            new_ids = db.session.query(ParkingSpot.id).filter(
+                ParkingSpot.lot_id == lot.id,
+                or_(ParkingSpot.spot_index > top, ParkingSpot.spot_index.in_(gaps)),
+            )
+            return [(spot_id, SpotStatus.AVAILABLE) for (spot_id,) in new_ids]
+
+        elif new_spots < current_spots:
+            surplus = current_spots - new_spots
+            highest_free = (
+                db.select(ParkingSpot.id)
+                .where(ParkingSpot.lot_id == lot.id, ParkingSpot.status == SpotStatus.AVAILABLE)
+                .order_by(ParkingSpot.spot_index.desc())
+                .limit(surplus)
+            )
+            occupied_now = db.select(ParkingLot.occupied_count).where(ParkingLot.id == lot.id).scalar_subquery()
+            # The occupied guard is part of the statement, so a booking that lands
+            # between the check above and this DELETE cannot be shrunk away.
+            removed_ids = db.session.execute(
+                db.delete(ParkingSpot)
+                .where(ParkingSpot.id.in_(highest_free), occupied_now <= new_spots)
+                .returning(ParkingSpot.id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
+            removed = len(removed_ids)
+            if removed < surplus:
+                db.session.rollback()
+                abort(409, f"Cannot reduce spots to {new_spots}. Spots were booked while the lot was being resized.")
+            ParkingLot.adjust_counts(lot.id, available=-removed)
+            return [(spot_id, REMOVED) for spot_id in removed_ids]
+        return []
+
     @staticmethod
     def delete_lot(lot):
         """Deletes a parking lot if it has no occupied spots."""
@@ -160,9 +297,12 @@ class AdminServices:
             abort(400, f"Cannot delete lot. It has {occupied_count} occupied spot(s).")
         
         try:
+            lot_id = lot.id
             db.session.delete(lot)
             db.session.commit()
-            cache.clear() # Clear cache after deleting a lot
+            allocator.forget(lot_id)
+            geo_index.remove(lot_id)
+            cache_tags.invalidate('lots:list', f'lot:{lot_id}')
         except HTTPException:
             raise
         except Exception as e:
@@ -181,9 +321,16 @@ class AdminServices:
         try:
             spot = ParkingSpot.query.filter_by(id=spot_id).first()
             spot.parking_lot.maximum_number_of_spots -= 1
+            lot_id, index = spot.lot_id, spot.spot_index
+            if spot.status == SpotStatus.OCCUPIED:
+                ParkingLot.adjust_counts(lot_id, occupied=-1)
+            else:
+                ParkingLot.adjust_counts(lot_id, available=-1)
             db.session.delete(spot)
             db.session.commit()
-            cache.clear() # Clear cache after deleting a spot
+            allocator.discard(lot_id, index)
+            cache_tags.invalidate('lots:list', f'lot:{lot_id}', *cache_tags.spot_tags(lot_id))
+            spot_events.publish(lot_id, [(spot_id, REMOVED)])
         except HTTPException:
             raise
         except Exception as e:
@@ -191,48 +338,89 @@ class AdminServices:
             print(f"Error deleting spot {spot_id}: {e}")
             abort(500, "An internal error occurred while deleting the spot.")
 
+    # Accepted search parameters per search type
+    SEARCH_PARAMS = {
+        'lot': ('location', 'city', 'pincode'),
+        'user': ('username', 'user_id', 'phone', 'pincode'),
+        'vehicle': ('vehicle_number', 'username'),
+    }
+
     @staticmethod
-    def search(search_type, params):
-        """Performs a search based on type and parameters."""
+    def search(search_type, params, page, per_page):
+        """
+        Searches lots, users or vehicles, combining every given parameter in one query.
+        Text parameters are prefix matches on indexed (normalized) columns.
+        Returns one numbered page with the total number of matches.
+        """
+        params = {key: value.strip() for key, value in params.items() if key not in PAGE_PARAMS and value.strip()}
         if not params:
             abort(400, "Search parameters are required.")
-        
-        param_key = list(params.keys())[0]
-        query_val = params[param_key]
+        unknown = set(params) - set(AdminServices.SEARCH_PARAMS[search_type])
+        if unknown:
+            abort(400, f"Invalid search parameter '{sorted(unknown)[0]}' for type '{search_type}'.")
 
         if search_type == 'lot':
-            if param_key == 'location':
-                return ParkingLot.query.filter(ParkingLot.prime_location_name.ilike(f'%{query_val}%')).all()
-            elif param_key == 'pincode':
-                return ParkingLot.query.filter_by(pin_code=query_val).all()
-        
-        elif search_type == 'user':
-            if param_key == 'user_id' or param_key == 'username':
-                return User.query.filter(User.username.ilike(f'%{query_val}%')).all()
-            elif param_key == 'phone':
-                return User.query.filter_by(phone_number=query_val).all()
-            elif param_key == 'pincode':
-                return User.query.filter_by(pincode=query_val).all()
-
-        elif search_type == 'vehicle':
-            if param_key == 'vehicle_number':
-                vehicle = Vehicle.query.filter(Vehicle.vehicle_number.ilike(f'%{query_val}%')).first()
-                return [vehicle] if vehicle else []
-
-        abort(400, f"Invalid search parameter '{param_key}' for type '{search_type}'.")
+            query = ParkingLot.query
+            if search_available():
+                match = lot_match_clause(prime_location_name__address=params.get('location'), city=params.get('city'))
+                if match is not None:
+                    query = query.filter(match)
+                elif 'location' in params or 'city' in params:
+                    return {"items": [], "total": 0, "page": page, "per_page": per_page}
+            else:
+                if 'location' in params:
+                    query = query.filter(ParkingLot.prime_location_name.ilike(f"%{params['location']}%"))
+                if 'city' in params:
+                    query = query.filter(ParkingLot.city.ilike(f"{params['city']}%"))
+            if 'pincode' in params:
+                query = query.filter(prefix_filter(ParkingLot.pin_code, params['pincode']))
+            result = numbered_page(query, [ParkingLot.id], page, per_page)
+            ParkingLot.preload_spots(result["items"])
+            return result
+
+        if search_type == 'user':
+            query = User.query
+            username = params.get('username') or params.get('user_id')
+            if username:
+                query = query.filter(prefix_filter(User.username_key, username.lower()))
+            if 'phone' in params:
+                query = query.filter(prefix_filter(User.phone_number, params['phone']))
+            if 'pincode' in params:
+                query = query.filter(prefix_filter(User.pincode, params['pincode']))
+            return numbered_page(query, [User.username], page, per_page)
+
+        query = Vehicle.query.options(joinedload(Vehicle.user))
+        if 'vehicle_number' in params:
+            query = query.filter(prefix_filter(Vehicle.number_key, Vehicle.normalize_number(params['vehicle_number'])))
+        if 'username' in params:
+            query = query.join(User, Vehicle.user_id == User.id).filter(
+                prefix_filter(User.username_key, params['username'].lower())
+            )
+        return numbered_page(query, [Vehicle.vehicle_number], page, per_page)
 
     @staticmethod
-    @cache.cached(timeout=300, key_prefix='admin_summary') # Cache for 5 minutes
+    @cache_tags.stale_while_revalidate(timeout=86400, tags=['lots:list', 'payments'], refresh_after=300) # Refresh in the background after 5 minutes
     def get_summary_data():
         """Aggregates data for the summary dashboard including payment statuses."""
-        lots_data = ParkingLot.query.all()
-        
-        paid_count = Payment.query.filter_by(payment_status=PaymentStatus.PAID).count()
-        pending_count = Payment.query.filter_by(payment_status=PaymentStatus.PENDING).count()
-        
+        lots_data = [
+            row._asdict() for row in db.session.query(
+                ParkingLot.id,
+                ParkingLot.prime_location_name,
+                ParkingLot.price_per_hour,
+                ParkingLot.maximum_number_of_spots,
+                ParkingLot.revenue,
+                ParkingLot.occupied_count.label('occupied_spots'),
+                ParkingLot.available_count.label('available_spots'),
+            ).order_by(ParkingLot.id)
+        ]
+
+        payment_counts = dict(
+            db.session.query(Payment.payment_status, db.func.count(Payment.id))
+            .group_by(Payment.payment_status)
+        )
         payment_summary = {
-            "paid": paid_count,
-            "pending": pending_count
+            "paid": payment_counts.get(PaymentStatus.PAID, 0),
+            "pending": payment_counts.get(PaymentStatus.PENDING, 0)
         }
         
         return {
@@ -240,17 +428,106 @@ class AdminServices:
             "payment_summary": payment_summary
         }
 
+    @staticmethod
+    def analytics_range():
+        """Reads the start/end query parameters (ISO dates or datetimes), defaulting to the last 7 days."""
+        def parse(key, default):
+            value = request.args.get(key)
+            if not value:
+                return default
+            try:
+                return hour_bucket(datetime.fromisoformat(value.replace('Z', '+00:00')))
+            except ValueError:
+                abort(400, f"Invalid value for '{key}'. Please use an ISO date or datetime.")
+        end = parse('end', hour_bucket(datetime.now(timezone.utc)) + timedelta(hours=1))
+        start = parse('start', end - timedelta(days=7))
+        if start >= end:
+            abort(400, "'start' must be before 'end'.")
+        return start, end
+
+    @staticmethod
+    def analytics_timeseries(start, end, lot_id=None, granularity='hour'):
+        """Hourly or daily totals between start and end, summed over one lot or all lots."""
+        if granularity == 'hour':
+            bucket = LotHourlyRollup.hour
+        elif granularity == 'day':
+            bucket = db.func.date(LotHourlyRollup.hour)
+        else:
+            abort(400, "Invalid granularity. Use 'hour' or 'day'.")
+
+        query = db.session.query(
+            bucket,
+            db.func.sum(LotHourlyRollup.bookings),
+            db.func.sum(LotHourlyRollup.releases),
+            db.func.sum(LotHourlyRollup.occupied_minutes),
+            db.func.sum(LotHourlyRollup.revenue),
+        ).filter(LotHourlyRollup.hour >= start, LotHourlyRollup.hour < end)
+        if lot_id is not None:
+            query = query.filter(LotHourlyRollup.lot_id == lot_id)
+
+        return [
+            {
+                "bucket": datetime.fromisoformat(value) if isinstance(value, str) else value,
+                "bookings": bookings,
+                "releases": releases,
+                "occupied_minutes": occupied_minutes,
+                "revenue": revenue,
+            }
+            for value, bookings, releases, occupied_minutes, revenue in query.group_by(bucket).order_by(bucket)
+        ]
+
+    @staticmethod
+    def analytics_by_lot(start, end):
+        """Totals per lot between start and end."""
+        rows = (
+            db.session.query(
+                LotHourlyRollup.lot_id,
+                ParkingLot.prime_location_name,
+                db.func.sum(LotHourlyRollup.bookings),
+                db.func.sum(LotHourlyRollup.releases),
+                db.func.sum(LotHourlyRollup.occupied_minutes),
+                db.func.sum(LotHourlyRollup.revenue),
+            )
+            .join(ParkingLot, LotHourlyRollup.lot_id == ParkingLot.id)
+            .filter(LotHourlyRollup.hour >= start, LotHourlyRollup.hour < end)
+            .group_by(LotHourlyRollup.lot_id, ParkingLot.prime_location_name)
+            .order_by(LotHourlyRollup.lot_id)
+        )
+        return [
+            {
+                "lot_id": lot_id,
+                "prime_location_name": name,
+                "bookings": bookings,
+                "releases": releases,
+                "occupied_minutes": occupied_minutes,
+                "revenue": revenue,
+            }
+            for lot_id, name, bookings, releases, occupied_minutes, revenue in rows
+        ]
+
 # --- API Endpoints ---
 @admin_ns.route('/parking-lots')
 class ParkingLotListResource(Resource):
-    @admin_ns.marshal_list_with(parking_lot_get_model)
+    @admin_ns.doc(params={
+        'cursor': 'Cursor returned in the X-Next-Cursor header of the previous page',
+        'limit': 'Page size',
+        'include': "Set to 'spots' to nest each lot's parking spots",
+    })
+    @admin_ns.response(200, 'Success', [parking_lot_get_model], headers={NEXT_CURSOR_HEADER: 'Cursor of the next page'})
+    @admin_ns.response(304, 'Not modified since the ETag in If-None-Match')
+    @cache_tags.conditional(tags=['lots:list', 'spots'])
     def get(self):
-        """Get a list of all parking lots."""
-        return AdminServices.get_all_lots()
+        """Get a page of parking lots."""
+        cursor, limit = page_args()
+        include_spots = wants_spots()
+        lots, next_cursor = AdminServices.get_all_lots(cursor, limit, include_spots)
+        model = parking_lot_get_model if include_spots else parking_lot_list_model
+        headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+        return serialize(lots, model), 200, headers
 
     @admin_required
     @admin_ns.expect(parking_lot_post_model, validate=True)
-    @admin_ns.marshal_with(parking_lot_get_model, code=201)
+    @admin_ns.marshal_with(parking_lot_list_model, code=201)
     def post(self):
         """Create a new parking lot."""
         data = request.get_json()
@@ -259,17 +536,20 @@ class ParkingLotListResource(Resource):
 @admin_ns.route('/parking-lot/<int:lot_id>')
 @admin_ns.param('lot_id', 'The unique identifier of the parking lot')
 class ParkingLotResource(Resource):
-    @admin_ns.marshal_with(parking_lot_get_model)
+    @admin_ns.doc(params={'include': "Set to 'spots' to nest the lot's parking spots"})
+    @admin_ns.response(200, 'Success', parking_lot_get_model)
+    @admin_ns.response(304, 'Not modified since the ETag in If-None-Match')
+    @cache_tags.conditional(tags=lambda lot_id: [f'lot:{lot_id}', f'spots:{lot_id}'])
     def get(self, lot_id):
         """Get details of a specific parking lot."""
         lot = AdminServices.get_lot_by_id(lot_id)
         if not lot:
             abort(404, f"Parking lot with ID {lot_id} not found.")
-        return lot
+        return serialize(lot, parking_lot_get_model if wants_spots() else parking_lot_list_model)
 
     @admin_required
     @admin_ns.expect(parking_lot_put_model, validate=True)
-    @admin_ns.marshal_with(parking_lot_get_model)
+    @admin_ns.marshal_with(parking_lot_list_model)
     def put(self, lot_id):
         """Update an existing parking lot."""
         lot = AdminServices.get_lot_by_id(lot_id)
@@ -288,6 +568,45 @@ class ParkingLotResource(Resource):
         AdminServices.delete_lot(lot)
         return '', 204
 
+@admin_ns.route('/parking-lots/stream')
+class SpotEventStreamResource(Resource):
+    @admin_required
+    @admin_ns.doc(params={'lot_id': 'Only stream changes of this parking lot'})
+    @admin_ns.produces(['text/event-stream'])
+    @admin_ns.response(503, 'Too many open streams in this worker')
+    def get(self):
+        """
+        Stream spot status changes as server-sent events.
+        Each 'spots' event carries a JSON list of {lot_id, spot_id, status, version} deltas.
+        """
+        lot_id = request.args.get('lot_id', type=int)
+        stream = spot_events.stream(lot_id)
+        if stream is None:
+            abort(503, "Too many open spot streams, retry shortly.")
+        return Response(
+            stream,
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
+
+@admin_ns.route('/parking-lot/<int:lot_id>/spots')
+@admin_ns.param('lot_id', 'The unique identifier of the parking lot')
+class ParkingLotSpotsResource(Resource):
+    @admin_ns.doc(params={
+        'status': 'Only return spots with this status (available, occupied)',
+        'cursor': 'Cursor returned in the X-Next-Cursor header of the previous page',
+        'limit': 'Page size',
+    })
+    @admin_ns.response(200, 'Success', [parking_spot_get_model], headers={NEXT_CURSOR_HEADER: 'Cursor of the next page'})
+    def get(self, lot_id):
+        """Get a page of the spots of a parking lot."""
+        if not AdminServices.get_lot_by_id(lot_id):
+            abort(404, f"Parking lot with ID {lot_id} not found.")
+        cursor, limit = page_args()
+        spots, next_cursor = AdminServices.get_lot_spots(lot_id, request.args.get('status'), cursor, limit)
+        headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+        return serialize(spots, parking_spot_get_model), 200, headers
+
 @admin_ns.route('/reservation/spot/<int:spot_id>')
 class ReservationResourse(Resource):
     
@@ -313,29 +632,128 @@ class SpotResource(Resource):
 class SearchResource(Resource):
 
     @admin_required
+    @admin_ns.doc(params={
+        'location': 'Lot: words of the lot name or address (prefixes)',
+        'city': 'Lot: city (prefix)',
+        'pincode': 'Lot or user: pincode prefix',
+        'username': 'User or vehicle owner: username prefix (case-insensitive)',
+        'phone': 'User: phone number prefix',
+        'vehicle_number': 'Vehicle: number prefix (spaces and dashes ignored)',
+        'page': 'Page number, starting at 1',
+        'per_page': f'Results per page (at most {MAX_PER_PAGE})',
+    })
     def get(self, search_type):
-        """Search for lots, users, or vehicles based on query parameters."""
-        if search_type not in ['lot', 'user', 'vehicle']:
+        """Search for lots, users, or vehicles; every given parameter must match."""
+        if search_type not in AdminServices.SEARCH_PARAMS:
             abort(400, "Invalid search type specified.")
-            
-        results = AdminServices.search(search_type, request.args.to_dict())
 
-        if search_type == 'lot':
-            return admin_ns.marshal(results, parking_lot_get_model)
-        elif search_type == 'user':
-            return admin_ns.marshal(results, display_user_model)
-        elif search_type == 'vehicle':
-            return admin_ns.marshal(results, vehicle_model)
-
-        return [], 200
+        page, per_page = page_number_args()
+        results = AdminServices.search(search_type, request.args.to_dict(), page, per_page)
+        return serialize(results, search_page_models[search_type])
 
 @admin_ns.route('/summary')
 class SummaryResource(Resource):
     
     @admin_required
-    @cache.cached(timeout=300) # Cache this response for 5 minutes
     @admin_ns.marshal_with(summary_response_model)
     def get(self):
         """Get summary data for the admin dashboard."""
         return AdminServices.get_summary_data()
 
+
+reservation_export_model = admin_ns.model('ReservationExport', {
+    'start_date': fields.String(description='First day to include (YYYY-MM-DD)'),
+    'end_date': fields.String(description='Last day to include (YYYY-MM-DD)'),
+    'lot_id': fields.Integer(description='Only export reservations of this parking lot'),
+})
+
+@admin_ns.route('/exports/reservations')
+class ReservationExportResource(Resource):
+
+    @admin_required
+    @admin_ns.expect(reservation_export_model)
+    def post(self):
+        """Start an export of the full reservation history as a gzip-compressed CSV."""
+        data = request.get_json(silent=True) or {}
+        for key in ('start_date', 'end_date'):
+            if data.get(key):
+                try:
+                    datetime.strptime(data[key], '%Y-%m-%d')
+                except (TypeError, ValueError):
+                    abort(400, f"Invalid date for '{key}'. Please use YYYY-MM-DD format.")
+        try:
+            task = task_queue.send(
+                'tasks.export_reservations', data.get('start_date'), data.get('end_date'), data.get('lot_id')
+            )
+            return {
+                'message': 'The reservation export has started.',
+                'task_id': task.id
+            }, 202
+        except Exception as e:
+            abort(500, f"Failed to start the export task: {e}")
+
+@admin_ns.route('/exports/reservations/<string:task_id>')
+class ReservationExportStatusResource(Resource):
+
+    @admin_required
+    def get(self, task_id):
+        """Get the state of a reservation export and, once done, its download link."""
+        result = task_queue.result(task_id)
+        if result.failed():
+            return {'state': result.state, 'error': str(result.result)}
+        return {'state': result.state, 'result': result.result if result.successful() else None}
+
+@admin_ns.route('/exports/download/<string:token>')
+class AdminExportDownloadResource(Resource):
+
+    @admin_required
+    def get(self, token):
+        """Download an admin export through the signed link returned by its task."""
+        path = resolve_export(token, admin=True)
+        if path is None:
+            abort(404, "This download link is invalid or has expired.")
+        # send_file streams the file from disk in blocks
+        return send_file(path, mimetype='application/gzip', as_attachment=True,
+                         download_name=os.path.basename(path), conditional=True)
+
+
+analytics_params = {
+    'start': 'Start of the range (ISO date or datetime, UTC). Defaults to 7 days before end',
+    'end': 'End of the range, exclusive (ISO date or datetime, UTC). Defaults to the next hour',
+}
+
+@admin_ns.route('/analytics/timeseries')
+class AnalyticsTimeseriesResource(Resource):
+
+    @admin_required
+    @admin_ns.doc(params=dict(analytics_params, lot_id='Only count this parking lot', granularity="'hour' (default) or 'day'"))
+    @admin_ns.marshal_list_with(rollup_bucket_model)
+    def get(self):
+        """Bookings, releases, occupied minutes and revenue per hour or day, from the rollup table."""
+        start, end = AdminServices.analytics_range()
+        return AdminServices.analytics_timeseries(
+            start, end, request.args.get('lot_id', type=int), request.args.get('granularity', 'hour')
+        )
+
+@admin_ns.route('/analytics/lots')
+class AnalyticsLotsResource(Resource):
+
+    @admin_required
+    @admin_ns.doc(params=analytics_params)
+    @admin_ns.marshal_list_with(rollup_lot_model)
+    def get(self):
+        """Bookings, releases, occupied minutes and revenue per parking lot, from the rollup table."""
+        start, end = AdminServices.analytics_range()
+        return AdminServices.analytics_by_lot(start, end)
+
+@admin_ns.route('/analytics/rebuild')
+class AnalyticsRebuildResource(Resource):
+
+    @admin_required
+    def post(self):
+        """Rebuild the rollup table from the full reservation history in the background."""
+        try:
+            task = task_queue.send('tasks.rebuild_lot_rollups')
+            return {'message': 'The rollup rebuild has started.', 'task_id': task.id}, 202
+        except Exception as e:
+            abort(500, f"Failed to start the rollup rebuild: {e}")
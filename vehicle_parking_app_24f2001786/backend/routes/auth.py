@@ -9,8 +9,10 @@ from flask_jwt_extended import (
     unset_jwt_cookies,
     current_user,
 )
-from models import User, UserRole, TokenBlocklist, user_register_model, user_login_model, db, display_user_model
-from tasks import send_welcome_email
+from models import User, UserRole, user_register_model, user_login_model, db, display_user_model
+from task_queue import task_queue
+from routes import cache_tags
+from revocation import revocation
 
 # --- Setup ---
 auth_ns = Namespace('auth', description='Authentication related operations')
@@ -43,7 +45,8 @@ class AuthService:
             )
             db.session.add(new_user)
             db.session.commit()
-            send_welcome_email.delay(data['email'])
+            cache_tags.invalidate('users:list')
+            task_queue.send('tasks.send_welcome_email', data['email'])
             return new_user
         except Exception as e:
             db.session.rollback()
@@ -75,9 +78,8 @@ class AuthService:
     def logout_user():
         """Handles user logout by blocklisting the refresh token and clearing cookies."""
         try:
-            jti = get_jwt()["jti"]
-            db.session.add(TokenBlocklist(jti=jti))
-            db.session.commit()
+            token = get_jwt()
+            revocation.revoke(token["jti"], token.get("exp"))
         except Exception as e:
             db.session.rollback()
             print(f"Error during logout: {e}")
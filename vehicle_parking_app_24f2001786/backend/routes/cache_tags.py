@@ -0,0 +1,224 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from functools import wraps
+from flask import request, current_app, Response
+from werkzeug.http import http_date, quote_etag
+from routes import cache
+
+logger = logging.getLogger(__name__)
+
+# --- Tag-Versioned Caching ---
+# Every cache entry is keyed on the current version of the tags it depends on,
+# e.g. 'lots:list', 'lot:<id>' or 'user:<id>'. A write bumps only the affected
+# tags; entries built on older versions are never read again and simply expire.
+
+def _version_key(tag):
+    return f"tagver:{tag}"
+
+
+def tag_versions(tags):
+    """Returns the current version of each tag, seeding missing ones."""
+    keys = [_version_key(tag) for tag in tags]
+    versions = list(cache.get_many(*keys)) if keys else []
+    for i, version in enumerate(versions):
+        if version is None:
+            # Seed with a timestamp so a tag whose version was evicted never
+            # comes back with a number that older entries were stored under.
+            cache.add(keys[i], int(time.time() * 1000), timeout=0)
+            versions[i] = cache.get(keys[i])
+    return versions
+
+
+def _modified_key(tag):
+    return f"tagmod:{tag}"
+
+
+def invalidate(*tags):
+    """Bumps the version of each tag, orphaning every entry that depends on it."""
+    now = time.time()
+    for tag in tags:
+        key = _version_key(tag)
+        if not cache.add(key, int(now * 1000), timeout=0):
+            cache.cache.inc(key)
+    if tags:
+        cache.set_many({_modified_key(tag): now for tag in tags}, timeout=0)
+
+
+def tags_modified(tags):
+    """Returns when any of the tags was last invalidated, as a POSIX timestamp."""
+    keys = [_modified_key(tag) for tag in tags]
+    stamps = list(cache.get_many(*keys)) if keys else []
+    now = time.time()
+    for key, stamp in zip(keys, stamps):
+        if stamp is None:
+            cache.add(key, now, timeout=0)
+    return max((stamp for stamp in stamps if stamp is not None), default=now)
+
+
+def user_tag(user_id):
+    """Tag for everything cached about one user (ids are raw UUID bytes)."""
+    return f"user:{user_id.hex() if isinstance(user_id, bytes) else user_id}"
+
+
+def vehicle_tag(vehicle_number):
+    """Tag for a vehicle's cached details, which embed its owner's profile."""
+    return f"vehicle:{vehicle_number}"
+
+
+def spot_tags(lot_id):
+    """Tags to invalidate when spot statuses of a lot change: the lot's spots and the spots of all lots."""
+    return (f"spots:{lot_id}", "spots")
+
+
+def _tagged_key(base, tags):
+    versions = tag_versions(tags)
+    suffix = ",".join(f"{tag}@{version}" for tag, version in zip(tags, versions))
+    return f"{base}|{suffix}"
+
+
+def cached(timeout, tags, query_string=False):
+    """
+    Caches a view's return value under the request path and the current version of `tags`.
+    `tags` is a list, or a callable receiving the view kwargs and returning one.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            tag_list = tags(**kwargs) if callable(tags) else tags
+            base = f"view:{request.path}"
+            if query_string:
+                base += "?" + "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+            key = _tagged_key(base, tag_list)
+
+            rv = cache.get(key)
+            if rv is None:
+                rv = f(*args, **kwargs)
+                cache.set(key, rv, timeout=timeout)
+            return rv
+        return decorated_function
+    return decorator
+
+
+def memoize(timeout, tags):
+    """
+    Caches a function's result per arguments under the current version of `tags`.
+    `tags` is a list, or a callable receiving the function arguments and returning one.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            tag_list = tags(*args, **kwargs) if callable(tags) else tags
+            arg_hash = hashlib.md5(repr((args, sorted(kwargs.items()))).encode()).hexdigest()
+            key = _tagged_key(f"memo:{f.__module__}.{f.__qualname__}:{arg_hash}", tag_list)
+
+            rv = cache.get(key)
+            if rv is None:
+                rv = f(*args, **kwargs)
+                cache.set(key, rv, timeout=timeout)
+            return rv
+        return decorated_function
+    return decorator
+
+
+def stale_while_revalidate(timeout, tags, refresh_after):
+    """
+    Caches a function's result like `memoize`, but never makes a caller wait on
+    a rebuild once a value exists: when the entry is older than `refresh_after`
+    seconds or one of `tags` was invalidated, the previous value is returned
+    and a background thread recomputes it. Only the very first call, or one
+    after the entry expired entirely (`timeout`), computes inline.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            tag_list = tags(*args, **kwargs) if callable(tags) else tags
+            arg_hash = hashlib.md5(repr((args, sorted(kwargs.items()))).encode()).hexdigest()
+            key = f"swr:{f.__module__}.{f.__qualname__}:{arg_hash}"
+            versions = tag_versions(tag_list)
+
+            def build():
+                value = f(*args, **kwargs)
+                cache.set(key, {"value": value, "versions": versions, "built_at": time.time()}, timeout=timeout)
+                return value
+
+            entry = cache.get(key)
+            if entry is None:
+                return build()
+
+            if entry["versions"] != versions or time.time() - entry["built_at"] > refresh_after:
+                # One refresh at a time per key, across workers
+                if cache.add(f"{key}:refreshing", 1, timeout=60):
+                    app = current_app._get_current_object()
+
+                    def refresh():
+                        with app.app_context():
+                            try:
+                                build()
+                            except Exception as e:
+                                logger.error(f"Background refresh of {key} failed: {e}", exc_info=True)
+                            finally:
+                                cache.delete(f"{key}:refreshing")
+
+                    threading.Thread(target=refresh, daemon=True).start()
+            return entry["value"]
+        return decorated_function
+    return decorator
+
+
+def conditional(tags=None, validators=None):
+    """
+    Answers conditional GETs for a view. The ETag is derived from the request
+    URL and the current version of `tags`, and Last-Modified from when they were
+    last invalidated. `validators` can replace the tags with a callable
+    receiving the view kwargs and returning (version, last_modified timestamp).
+    A matching If-None-Match (or If-Modified-Since, when no ETag is sent)
+    returns 304 before the view runs, so unchanged resources cost no query and
+    no marshalling. Other 200 responses get the validators attached.
+    The ETag is weak because the body may be sent identity, gzip or br encoded.
+    Last-Modified is rounded up to the second and only sent once that second
+    has passed, so a later write always moves it forward.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if validators is not None:
+                version, last_modified = validators(**kwargs)
+            else:
+                tag_list = tags(**kwargs) if callable(tags) else tags
+                version, last_modified = tag_versions(tag_list), tags_modified(tag_list)
+            etag = hashlib.md5(repr((request.full_path, version)).encode()).hexdigest()
+            modified = math.ceil(last_modified)
+            headers = {
+                'ETag': quote_etag(etag, weak=True),
+                # Let clients store the body but revalidate it on every use
+                'Cache-Control': 'no-cache',
+                'Vary': 'Accept-Encoding',
+            }
+            if modified <= time.time():
+                headers['Last-Modified'] = http_date(modified)
+
+            if request.if_none_match:
+                unchanged = request.if_none_match.contains_weak(etag)
+            else:
+                since = request.if_modified_since
+                unchanged = since is not None and modified <= since.timestamp()
+            if unchanged:
+                return Response(status=304, headers=headers)
+
+            rv = f(*args, **kwargs)
+            if isinstance(rv, Response):
+                if rv.status_code == 200:
+                    rv.headers.extend({k: v for k, v in headers.items() if k != 'Vary'})
+                    rv.vary.add('Accept-Encoding')
+                return rv
+            if not isinstance(rv, tuple):
+                return rv, 200, headers
+            data, code, *extra = rv + (None,) * (3 - len(rv))
+            if code not in (None, 200):
+                return rv
+            return data, 200, {**(extra[0] or {}), **headers}
+        return decorated_function
+    return decorator
@@ -0,0 +1,96 @@
+import base64
+import json
+from flask import request
+from flask_restx import abort
+from sqlalchemy import and_, or_
+
+# --- Cursor Pagination Helpers ---
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Numbered pages (searches that report a total)
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+PAGE_PARAMS = ('page', 'per_page')
+
+
+def page_args():
+    """Reads the `cursor` and `limit` query parameters of the current request."""
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        abort(400, "The 'limit' parameter must be an integer.")
+    if limit < 1:
+        abort(400, "The 'limit' parameter must be at least 1.")
+    return request.args.get('cursor'), min(limit, MAX_PAGE_SIZE)
+
+
+def wants_spots():
+    """True when the client opted into nested spots with `include=spots`."""
+    return 'spots' in request.args.get('include', '').split(',')
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        abort(400, "Invalid pagination cursor.")
+
+
+def keyset_page(query, columns, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Returns one page of `query` ordered by `columns` (ascending, last column unique)
+    and the cursor of the next page, or None on the last page.
+    Seeks past the cursor instead of using OFFSET, so deep pages cost the same as the first.
+    """
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(columns):
+            abort(400, "Invalid pagination cursor.")
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+        conditions = []
+        for i, column in enumerate(columns):
+            equal_prefix = [columns[j] == values[j] for j in range(i)]
+            conditions.append(and_(*equal_prefix, column > values[i]))
+        query = query.filter(or_(*conditions))
+
+    items = query.order_by(*columns).limit(limit + 1).all()
+    if len(items) <= limit:
+        return items, None
+
+    items = items[:limit]
+    last = items[-1]
+    return items, encode_cursor([getattr(last, column.key) for column in columns])
+
+
+def offset_from_cursor(cursor):
+    """Decodes the cursor of a ranked listing, which carries the offset of the next page."""
+    if not cursor:
+        return 0
+    values = decode_cursor(cursor)
+    if len(values) != 1 or not isinstance(values[0], int) or values[0] < 0:
+        abort(400, "Invalid pagination cursor.")
+    return values[0]
+
+
+def page_number_args():
+    """Reads the `page` (1-based) and `per_page` query parameters of the current request."""
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', DEFAULT_PER_PAGE))
+    except ValueError:
+        abort(400, "The 'page' and 'per_page' parameters must be integers.")
+    if page < 1 or per_page < 1:
+        abort(400, "The 'page' and 'per_page' parameters must be at least 1.")
+    return page, min(per_page, MAX_PER_PAGE)
+
+
+def numbered_page(query, order_by, page, per_page):
+    """Returns {items, total, page, per_page} for one numbered page of `query`."""
+    total = query.order_by(None).count()
+    items = query.order_by(*order_by).limit(per_page).offset((page - 1) * per_page).all()
+    return {"items": items, "total": total, "page": page, "per_page": per_page}
@@ -1,20 +1,30 @@
-from flask import request
-from datetime import datetime, timedelta
+import os
+import calendar
+from flask import request, send_file
+from datetime import datetime, timedelta, timezone
 from flask_restx import Resource, Namespace, abort, fields
 from flask_jwt_extended import jwt_required, current_user
 from models import ( 
     db ,
     User, UserRole, display_user_model,
-    ParkingLot, SpotStatus, parking_lot_get_model,
+    ParkingLot, SpotStatus, parking_lot_get_model, parking_lot_list_model,
     ParkingSpot,
     Vehicle, vehicle_model,
     ReservedParkingSpot, reservation_post_model, reservation_get_model,reservation_put_model,ReservationStatus,
-    Payment, payment_post_model, PaymentStatus
+    Payment, payment_post_model, PaymentStatus,
+    LotHourlyRollup, search_available, search_lot_ids
     )
-from sqlalchemy import or_
-from collections import Counter
+from sqlalchemy import or_, func, extract
 from .admin import admin_required 
-from routes import cache # Import the cache object
+from routes import cache_tags
+from security import invalidate_user_identity
+from allocator import allocator
+from geoindex import geo_index
+from events import spot_events
+from serializers import serialize
+from task_queue import task_queue
+from export_links import resolve_export
+from routes.pagination import NEXT_CURSOR_HEADER, page_args, wants_spots, keyset_page, encode_cursor, offset_from_cursor
 
 # --- Setup ---
 user_ns = Namespace('users', description='User related operations')
@@ -22,6 +32,7 @@ user_ns = Namespace('users', description='User related operations')
 # --- Models for Swagger Documentation ---
 display_user_model = display_user_model(user_ns)
 parking_lot_get_model = parking_lot_get_model(user_ns)
+parking_lot_list_model = parking_lot_list_model(user_ns)
 vehicle_model = vehicle_model(user_ns)
 reservation_post_model = reservation_post_model(user_ns)
 reservation_get_model = reservation_get_model(user_ns)
@@ -40,6 +51,17 @@ user_summary_model = user_ns.model('UserSummary', {
     'favorite_spots': fields.List(fields.Nested(favorite_spots_model))
 })
 
+nearby_lot_model = user_ns.inherit('NearbyParkingLot', parking_lot_list_model, {
+    'distance_km': fields.Float(description="Distance from the requested point in kilometres"),
+})
+
+# Upper bounds for the nearby search parameters
+NEARBY_MAX_RADIUS_KM = 50
+NEARBY_MAX_LIMIT = 50
+
+# How far past the server's clock a client's leaving timestamp may be
+LEAVING_CLOCK_SKEW = timedelta(minutes=5)
+
 
 # --- Service Layer for User Logic ---
 class UserService:
@@ -67,6 +89,13 @@ class UserService:
         user.address = data.get('address', user.address)
         user.pincode = data.get('pincode', user.pincode)
         db.session.commit()
+        # Vehicle details embed the owner's profile
+        cache_tags.invalidate(
+            'users:list',
+            cache_tags.user_tag(user.id),
+            *(cache_tags.vehicle_tag(vehicle.vehicle_number) for vehicle in user.vehicles),
+        )
+        invalidate_user_identity(user.id)
         return user
         
 
@@ -78,17 +107,58 @@ class UserService:
         return User.query.filter(User.role != UserRole.ADMIN).order_by(User.full_name).all()
     
     @staticmethod
-    def find_parking_lots(search_query):
+    def find_parking_lots(search_query, cursor=None, limit=None, include_spots=False):
         """
-        Finds all active parking lots by pincode or location name.
+        Finds one page of active parking lots matching every word of the query as a
+        prefix of the lot name, address, city, district or pincode, best match first.
+        Falls back to a LIKE scan on pincode and address without the full-text index.
         """
-        return ParkingLot.query.filter(
-            ParkingLot.is_active == True,
-            or_(
-                ParkingLot.pin_code.like(f"%{search_query}%"),
-                ParkingLot.address.like(f"%{search_query}%")
+        if search_available():
+            offset = offset_from_cursor(cursor)
+            ids = search_lot_ids(search_query, offset, limit + 1)
+            next_cursor = encode_cursor([offset + limit]) if len(ids) > limit else None
+            ids = ids[:limit]
+            by_id = {lot.id: lot for lot in ParkingLot.query.filter(ParkingLot.id.in_(ids))} if ids else {}
+            lots = [by_id[lot_id] for lot_id in ids if lot_id in by_id]
+        else:
+            query = ParkingLot.query.filter(
+                ParkingLot.is_active == True,
+                or_(
+                    ParkingLot.pin_code.like(f"%{search_query}%"),
+                    ParkingLot.address.like(f"%{search_query}%")
+                )
             )
-        ).all()
+            lots, next_cursor = keyset_page(query, [ParkingLot.id], cursor, limit)
+        if include_spots:
+            ParkingLot.preload_spots(lots)
+        return lots, next_cursor
+
+    @staticmethod
+    def find_nearby_lots(lat, lon, radius_km, limit, available_only=True):
+        """
+        Finds the `limit` nearest active lots within `radius_km` of a point using the
+        in-memory grid, then reads their live spot counters by primary key.
+        Candidates are checked a batch at a time, so full lots only cost extra
+        lookups when they are skipped.
+        """
+        candidates = geo_index.nearby(lat, lon, radius_km)
+        lots = []
+        while len(lots) < limit:
+            batch = [c for _, c in zip(range(limit * 2), candidates)]
+            if not batch:
+                break
+            by_id = {lot.id: lot for lot in ParkingLot.query.filter(ParkingLot.id.in_([lot_id for _, lot_id in batch]))}
+            for distance, lot_id in batch:
+                lot = by_id.get(lot_id)
+                if lot is None or not lot.is_active:
+                    continue
+                if available_only and lot.available_count <= 0:
+                    continue
+                lot.distance_km = round(distance, 3)
+                lots.append(lot)
+                if len(lots) == limit:
+                    break
+        return lots
 
     @staticmethod
     def get_register_vehicle_details(vehicle_number):
@@ -109,9 +179,64 @@ class UserService:
             abort(409, f'Vehicle {data["vehicle_number"]} is already have reservation.')
         
         spot = ParkingSpot.query.filter_by(id=data['spot_id']).first()
-        spot.status = SpotStatus.OCCUPIED
-        
+        if not spot:
+            abort(404, 'Parking spot not found.')
+        if not ParkingSpot.try_occupy(spot.id):
+            db.session.rollback()
+            abort(409, f'Parking spot {spot.spot_number} is already occupied.')
+
+        UserService._reserve_spot(spot, data)
+        allocator.discard(spot.lot_id, spot.spot_index)
+
+    @staticmethod
+    def book_any_spot(lot_id, data):
+        """
+        Book the lowest numbered free spot of a parking lot for a vehicle.
+        """
+        if ReservedParkingSpot.query.filter_by(vehicle_number=data['vehicle_number'], status=ReservationStatus.ACTIVE).first():
+            abort(409, f'Vehicle {data["vehicle_number"]} is already have reservation.')
+
+        lot = ParkingLot.query.get(lot_id)
+        if not lot or not lot.is_active:
+            abort(404, f'Parking lot with ID {lot_id} not found.')
+
+        reloaded = False
+        while True:
+            claimed = allocator.claim(lot_id)
+            if claimed is None:
+                # The heap is per process and misses spots released by other
+                # workers, so only the database may decide that the lot is full.
+                claimed = ParkingSpot.lowest_available(lot_id)
+                if claimed is None:
+                    abort(409, 'This parking lot is full.')
+                allocator.invalidate(lot_id)
+            index, spot_id = claimed
+            # Another worker may have taken the spot since our view was built; skip it.
+            if ParkingSpot.try_occupy(spot_id):
+                break
+            if not reloaded:
+                # One miss means the heap is stale, so reload it rather than
+                # paying a failed UPDATE for every spot booked elsewhere.
+                allocator.invalidate(lot_id)
+                reloaded = True
+
+        try:
+            spot = ParkingSpot.query.get(spot_id)
+            UserService._reserve_spot(spot, data)
+        except Exception:
+            db.session.rollback()
+            allocator.release(lot_id, index, spot_id)
+            raise
+        return spot
+
+    @staticmethod
+    def _reserve_spot(spot, data):
+        """
+        Registers the vehicle if needed and creates the reservation for an already occupied spot.
+        """
+        tags = [cache_tags.user_tag(current_user.id), *cache_tags.spot_tags(spot.lot_id)]
         if not Vehicle.query.filter_by(vehicle_number=data['vehicle_number']).first():
+            tags.append(cache_tags.vehicle_tag(data['vehicle_number']))
             new_vehicle = Vehicle(
                 vehicle_number=data['vehicle_number'],
                 user_id=current_user.id,
@@ -122,17 +247,22 @@ class UserService:
             )
             db.session.add(new_vehicle)
         
+        parked_at = datetime.now(timezone.utc)
         reservation = ReservedParkingSpot(
             user_id=current_user.id,
             vehicle_number=data['vehicle_number'],
             location = spot.parking_lot.address,
             spot_id=spot.id,
             parking_cost_per_hour=spot.parking_lot.price_per_hour,
+            parking_timestamp=parked_at,
         )
         db.session.add(reservation)
+        ParkingLot.adjust_counts(spot.lot_id, available=-1, occupied=1)
+        LotHourlyRollup.record_booking(spot.lot_id, parked_at)
         db.session.commit()
-        # Invalidate the current user's summary cache since they made a new booking
-        cache.delete_memoized(UserService.get_user_summary, current_user.id)
+        # Invalidate the lot's spot listings, the current user's summary and a newly registered vehicle
+        cache_tags.invalidate(*tags)
+        spot_events.publish(spot.lot_id, [(spot.id, SpotStatus.OCCUPIED)])
     
     @staticmethod
     def get_all_reservations():
@@ -152,15 +282,57 @@ class UserService:
         if reservation.user_id != current_user.id:
             abort(403, 'Forbidden: You are not authorized to update this reservation.')
         
-        reservation.leaving_timestamp = datetime.fromisoformat(data['leaving_timestamp'].replace('Z', '+00:00'))
-        reservation.status = ReservationStatus.COMPLETED
-        reservation.parking_spot.status = SpotStatus.AVAILABLE
-        reservation.parking_spot.revenue += reservation.parking_cost_per_hour
-        reservation.parking_spot.parking_lot.revenue += reservation.parking_cost_per_hour
+        if reservation.status != ReservationStatus.ACTIVE:
+            abort(409, 'This reservation has already been completed.')
+
+        leaving_timestamp = UserService._parse_leaving_timestamp(data, reservation)
+        # Conditional on the status, so only one of two concurrent releases goes through
+        if not ReservedParkingSpot.try_complete(reservation.id, leaving_timestamp):
+            db.session.rollback()
+            abort(409, 'This reservation has already been completed.')
+
+        spot = reservation.parking_spot
+        released = False
+        if spot is not None:
+            spot.revenue += reservation.parking_cost_per_hour
+            spot.parking_lot.revenue += reservation.parking_cost_per_hour
+            LotHourlyRollup.record_release(
+                spot.lot_id, reservation.parking_timestamp,
+                leaving_timestamp, reservation.parking_cost_per_hour,
+            )
+            # The counters only move if the spot was really still held
+            released = ParkingSpot.try_release(spot.id)
+            if released:
+                ParkingLot.adjust_counts(spot.lot_id, available=1, occupied=-1)
         db.session.commit()
         # Invalidate the current user's summary cache since their reservation history changed
-        cache.delete_memoized(UserService.get_user_summary, current_user.id)
+        cache_tags.invalidate(cache_tags.user_tag(current_user.id))
+        if released:
+            allocator.release(spot.lot_id, spot.spot_index, spot.id)
+            cache_tags.invalidate(*cache_tags.spot_tags(spot.lot_id))
+            spot_events.publish(spot.lot_id, [(spot.id, SpotStatus.AVAILABLE)])
     
+    @staticmethod
+    def _parse_leaving_timestamp(data, reservation):
+        """
+        Parses the client's leaving timestamp as UTC (naive values are taken as
+        UTC) and rejects one before the reservation started or in the future.
+        """
+        try:
+            leaving_timestamp = datetime.fromisoformat(data['leaving_timestamp'].replace('Z', '+00:00'))
+        except (KeyError, TypeError, AttributeError, ValueError):
+            abort(400, "'leaving_timestamp' must be an ISO 8601 timestamp.")
+        if leaving_timestamp.tzinfo is None:
+            leaving_timestamp = leaving_timestamp.replace(tzinfo=timezone.utc)
+        parked_at = reservation.parking_timestamp
+        if parked_at.tzinfo is None:
+            parked_at = parked_at.replace(tzinfo=timezone.utc)
+        if leaving_timestamp < parked_at:
+            abort(400, "'leaving_timestamp' is before the reservation started.")
+        if leaving_timestamp > datetime.now(timezone.utc) + LEAVING_CLOCK_SKEW:
+            abort(400, "'leaving_timestamp' is in the future.")
+        return leaving_timestamp
+
     @staticmethod
     def process_payment(data):
         """
@@ -174,37 +346,72 @@ class UserService:
         payment.payment_status = PaymentStatus.PAID
         db.session.add(payment)
         db.session.commit()
-        # Invalidate the current user's summary cache in case payment affects summary data
-        cache.delete_memoized(UserService.get_user_summary, current_user.id)
+        # Invalidate the current user's summary cache and the admin payment summary
+        cache_tags.invalidate(cache_tags.user_tag(current_user.id), 'payments')
 
     @staticmethod
-    @cache.memoize(timeout=900) # Cache per user for 15 minutes
+    @cache_tags.memoize(timeout=900, tags=lambda user_id: [cache_tags.user_tag(user_id)]) # Cache per user for 15 minutes
     def get_user_summary(user_id):
         """
         Generates summary data for a specific user's dashboard over the last 3 months.
         """
         three_months_ago = datetime.utcnow() - timedelta(days=90)
-        
-        reservations = ReservedParkingSpot.query.filter(
+        recent = (
             ReservedParkingSpot.user_id == user_id,
-            ReservedParkingSpot.parking_timestamp >= three_months_ago
-        ).all()
+            ReservedParkingSpot.parking_timestamp >= three_months_ago,
+        )
+        bookings = func.count(ReservedParkingSpot.id)
+
+        # Bookings per calendar month
+        year = extract('year', ReservedParkingSpot.parking_timestamp)
+        month = extract('month', ReservedParkingSpot.parking_timestamp)
+        monthly_rows = (
+            db.session.query(month, bookings)
+            .filter(*recent)
+            .group_by(year, month)
+            .order_by(year, month)
+            .all()
+        )
+        monthly_counts = {}
+        for month_number, count in monthly_rows:
+            name = calendar.month_name[int(month_number)]
+            monthly_counts[name] = monthly_counts.get(name, 0) + count
 
-        monthly_counts = Counter(res.parking_timestamp.strftime('%B') for res in reservations)
-        lot_locations = [res.parking_spot.parking_lot.prime_location_name for res in reservations if res.parking_spot and res.parking_spot.parking_lot]
-        favorite_lots = Counter(lot_locations)
+        # Top 5 lots by number of bookings
+        lot_name = ParkingLot.prime_location_name
+        favorite_lots = (
+            db.session.query(lot_name, bookings)
+            .join(ParkingSpot, ReservedParkingSpot.spot_id == ParkingSpot.id)
+            .join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id)
+            .filter(*recent)
+            .group_by(lot_name)
+            .order_by(bookings.desc(), lot_name)
+            .limit(5)
+            .all()
+        )
+        top_lots = [name for name, _ in favorite_lots]
 
-        top_lots = [lot[0] for lot in favorite_lots.most_common(5)]
-        favorite_spots_data = []
-        for lot_name in top_lots:
-            spots_in_lot = [res.parking_spot.spot_number for res in reservations if res.parking_spot and res.parking_spot.parking_lot.prime_location_name == lot_name]
-            if spots_in_lot:
-                most_common_spot = Counter(spots_in_lot).most_common(1)[0][0]
-                favorite_spots_data.append({"lot_name": lot_name, "spot_number": most_common_spot})
+        # Most booked spot within each of those lots
+        favorite_spots = {}
+        if top_lots:
+            spot_rows = (
+                db.session.query(lot_name, ParkingSpot.spot_number, bookings)
+                .join(ParkingSpot, ReservedParkingSpot.spot_id == ParkingSpot.id)
+                .join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id)
+                .filter(*recent, lot_name.in_(top_lots))
+                .group_by(lot_name, ParkingSpot.spot_number)
+                .order_by(bookings.desc(), ParkingSpot.spot_number)
+                .all()
+            )
+            for name, spot_number, _ in spot_rows:
+                favorite_spots.setdefault(name, spot_number)
+        favorite_spots_data = [
+            {"lot_name": name, "spot_number": favorite_spots[name]} for name in top_lots if name in favorite_spots
+        ]
 
         return {
-            "monthly_bookings": dict(monthly_counts),
-            "favorite_lots": dict(favorite_lots.most_common(5)),
+            "monthly_bookings": monthly_counts,
+            "favorite_lots": dict(favorite_lots),
             "favorite_spots": favorite_spots_data
         }
 
@@ -229,7 +436,7 @@ class MeResource(Resource):
 @user_ns.route('/')
 class UserListResource(Resource):
     @admin_required
-    @cache.cached(timeout=300) # Cache this list for 5 minutes
+    @cache_tags.cached(timeout=300, tags=['users:list']) # Cache this list for 5 minutes
     @user_ns.marshal_list_with(display_user_model)
     def get(self):
         """Get a list of all users (Admin only)."""
@@ -238,19 +445,56 @@ class UserListResource(Resource):
 @user_ns.route('/search')
 class ParkingSearchResource(Resource):
     @jwt_required()
-    @cache.cached(timeout=120, query_string=True) # Cache based on query parameters for 2 minutes
-    @user_ns.marshal_list_with(parking_lot_get_model)
+    @cache_tags.cached(timeout=120, tags=['lots:list'], query_string=True) # Cache based on query parameters for 2 minutes
+    @user_ns.doc(params={
+        'q': 'Words to match against lot name, address, city, district or pincode (prefixes allowed)',
+        'cursor': 'Cursor returned in the X-Next-Cursor header of the previous page',
+        'limit': 'Page size',
+        'include': "Set to 'spots' to nest each lot's parking spots",
+    })
+    @user_ns.response(200, 'Success', [parking_lot_get_model], headers={NEXT_CURSOR_HEADER: 'Cursor of the next page'})
     def get(self):
         """Search for available parking lots by pincode or location."""
         query = request.args.get('q', '')
         if not query:
             abort(400, "A search query ('q' parameter) is required.")
-        return UserService.find_parking_lots(query)
+        cursor, limit = page_args()
+        include_spots = wants_spots()
+        lots, next_cursor = UserService.find_parking_lots(query, cursor, limit, include_spots)
+        model = parking_lot_get_model if include_spots else parking_lot_list_model
+        headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+        return serialize(lots, model), 200, headers
+
+@user_ns.route('/nearby')
+class NearbyLotsResource(Resource):
+    @jwt_required()
+    @user_ns.doc(params={
+        'lat': 'Latitude of the search point',
+        'lon': 'Longitude of the search point',
+        'radius': f'Search radius in kilometres (default 5, max {NEARBY_MAX_RADIUS_KM})',
+        'limit': f'Number of lots to return (default 10, max {NEARBY_MAX_LIMIT})',
+        'available_only': "Set to 'false' to include lots with no free spots",
+    })
+    @user_ns.response(200, 'Success', [nearby_lot_model])
+    def get(self):
+        """Get the nearest active parking lots to a point, nearest first."""
+        lat = request.args.get('lat', type=float)
+        lon = request.args.get('lon', type=float)
+        if lat is None or lon is None:
+            abort(400, "Numeric 'lat' and 'lon' parameters are required.")
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            abort(400, "Latitude must be between -90 and 90 and longitude between -180 and 180.")
+        radius = request.args.get('radius', 5, type=float)
+        if not 0 < radius <= NEARBY_MAX_RADIUS_KM:
+            abort(400, f"'radius' must be between 0 and {NEARBY_MAX_RADIUS_KM} km.")
+        limit = max(1, min(request.args.get('limit', 10, type=int), NEARBY_MAX_LIMIT))
+        available_only = request.args.get('available_only', 'true').lower() != 'false'
+        return serialize(UserService.find_nearby_lots(lat, lon, radius, limit, available_only), nearby_lot_model)
     
 @user_ns.route('/booking/<string:vehicle_number>')
 class BookingResourceGet(Resource):
     @jwt_required()
-    @cache.cached(timeout=300) # Cache vehicle details for 5 minutes
+    @cache_tags.cached(timeout=300, tags=lambda vehicle_number: [cache_tags.vehicle_tag(vehicle_number)]) # Cache vehicle details for 5 minutes
     @user_ns.marshal_with(vehicle_model)
     def get(self, vehicle_number):
         """Get details of a specific vehicle."""
@@ -268,6 +512,21 @@ class BookingResourcePost(Resource):
         UserService.book_parking_spot(data)
         return {'message': 'Parking spot booked successfully'}, 201
     
+@user_ns.route('/parking-lot/<int:lot_id>/book')
+@user_ns.param('lot_id', 'The unique identifier of the parking lot')
+class BookAnySpotResource(Resource):
+    @jwt_required()
+    @user_ns.expect(vehicle_model)
+    def post(self, lot_id):
+        """Book the first free spot of a parking lot."""
+        data = request.get_json()
+        spot = UserService.book_any_spot(lot_id, data)
+        return {
+            'message': 'Parking spot booked successfully',
+            'spot_id': spot.id,
+            'spot_number': spot.spot_number,
+        }, 201
+    
 @user_ns.route('/reservations')
 class ReservationsResource(Resource):
     @jwt_required()
@@ -304,15 +563,13 @@ class UserSummaryResource(Resource):
         # The service method is memoized, so this will hit the cache
         return UserService.get_user_summary(current_user.id)
     
-from tasks.reports import export_user_parking_data_to_csv
-
 @user_ns.route('/export-csv')
 class ExportDataResource(Resource):
     @jwt_required()
     def post(self):
         """Trigger an asynchronous export of the user's parking data to CSV."""
         try:
-            task = export_user_parking_data_to_csv.delay(current_user.id)
+            task = task_queue.send('tasks.export_user_parking_data_to_csv', current_user.uuid)
             return {
                 'message': 'Your data export has started. You will receive an email with the CSV file shortly.',
                 'task_id': task.id
@@ -320,3 +577,14 @@ class ExportDataResource(Resource):
         except Exception as e:
             abort(500, f"Failed to start the export task: {e}")
 
+
+@user_ns.route('/exports/<string:token>')
+class ExportDownloadResource(Resource):
+    def get(self, token):
+        """Download a compressed data export through the signed link sent by email."""
+        path = resolve_export(token)
+        if path is None:
+            abort(404, "This download link is invalid or has expired.")
+        # send_file streams the file from disk in blocks
+        return send_file(path, mimetype='application/gzip', as_attachment=True,
+                         download_name=os.path.basename(path), conditional=True)
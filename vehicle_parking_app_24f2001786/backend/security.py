@@ -1,22 +1,95 @@
 # Token Based Authentication
 
-from models import User, TokenBlocklist
+from models import db, User
+from revocation import revocation
+from flask import current_app
 from flask_jwt_extended import JWTManager
+from sqlalchemy.orm import make_transient_to_detached
+from routes import cache
+from threading import Lock
+import time
 import uuid
 
 jwt = JWTManager()
 
+# --- User Identity Cache ---
+# Resolving the JWT `sub` to a User is served from a per-process dict, then
+# Redis, and only then the database. Only the fields authorization needs are
+# cached (never the password hash); any other attribute is loaded from the
+# database on first access. Cached rows are re-attached to the request's
+# session with merge(load=False), which issues no query. Invalidation cannot
+# reach other processes' dicts, so their entries live only
+# JWT_USER_LOCAL_CACHE_TTL seconds.
+_local_users = {}
+_local_users_lock = Lock()
+LOCAL_USER_CACHE_MAX_ENTRIES = 10000
+CACHED_USER_FIELDS = ("id", "role")
+
+
+def _user_cache_key(identity):
+    return f"jwt_user:{identity}"
+
+
+def _user_to_row(user):
+    return {field: getattr(user, field) for field in CACHED_USER_FIELDS}
+
+
+def _user_from_row(row):
+    user = User(**row)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def invalidate_user_identity(user_id):
+    """Drops a user from both identity cache tiers (call after profile changes)."""
+    identity = str(uuid.UUID(bytes=user_id))
+    with _local_users_lock:
+        _local_users.pop(identity, None)
+    cache.delete(_user_cache_key(identity))
+
+
 @jwt.user_identity_loader
 def user_identity_lookup(user):
     return str(uuid.UUID(bytes=user.id))
 
+@jwt.additional_claims_loader
+def add_role_claim(user):
+    # Lets admin_required authorize from the token alone
+    if current_app.config.get("JWT_ROLE_IN_CLAIMS"):
+        return {"role": user.role_value}
+    return {}
+
 @jwt.user_lookup_loader
 def user_lookup_callback(_jwt_header, jwt_data):
     identity = jwt_data["sub"]
-    return User.query.filter_by(id=uuid.UUID(identity).bytes).one_or_none()  
+    ttl = current_app.config.get("JWT_USER_CACHE_TTL", 0)
+    if not ttl:
+        return User.query.filter_by(id=uuid.UUID(identity).bytes).one_or_none()
+
+    now = time.monotonic()
+    with _local_users_lock:
+        entry = _local_users.get(identity)
+    if entry and entry[0] > now:
+        return _user_from_row(entry[1])
+
+    key = _user_cache_key(identity)
+    row = cache.get(key)
+    if row is None:
+        user = User.query.filter_by(id=uuid.UUID(identity).bytes).one_or_none()
+        if user is None:
+            return None
+        row = _user_to_row(user)
+        cache.set(key, row, timeout=ttl)
+    else:
+        user = _user_from_row(row)
+
+    local_ttl = min(ttl, current_app.config.get("JWT_USER_LOCAL_CACHE_TTL", 5))
+    with _local_users_lock:
+        if len(_local_users) >= LOCAL_USER_CACHE_MAX_ENTRIES:
+            _local_users.clear()
+        _local_users[identity] = (now + local_ttl, row)
+    return user
 
 @jwt.token_in_blocklist_loader
 def check_if_token_revoked(jwt_header, jwt_payload):
-    jti = jwt_payload["jti"]
-    token = TokenBlocklist.query.filter_by(jti=jti).first()
-    return token is not None
\ No newline at end of file
+    return revocation.is_revoked(jwt_payload["jti"])
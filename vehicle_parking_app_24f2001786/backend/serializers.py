@@ -0,0 +1,197 @@
+# Fast Response Serialization
+
+import gzip
+from flask import current_app, make_response, request
+from flask_restx import fields
+from flask_restx.marshalling import marshal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Field classes whose formatting is inlined into the generated code
+_INLINE = {
+    fields.String: "(v if v.__class__ is str else str(v))",
+    fields.Integer: "int(v)",
+    fields.Float: "float(v)",
+    fields.Boolean: "(v if v.__class__ is bool else {fmt}(v))",
+}
+
+# Compiled serializers, keyed by model identity (models are dicts and not hashable)
+_compiled = {}
+
+
+def _plain_attribute(key, field):
+    attribute = key if field.attribute is None else field.attribute
+    if isinstance(attribute, str) and "." not in attribute:
+        return attribute
+    return None
+
+
+def _has_default_output(field):
+    return type(field).output is fields.Raw.output and not field.mask
+
+
+def _none_value(field):
+    """What Raw.output returns for a missing value, when it does not depend on call time."""
+    if callable(field.default):
+        return None, False
+    default = field.default
+    return (field.format(default) if default else default), True
+
+
+def _nested_serializer(field):
+    """Serializer for a Nested field's value, with Nested.output's handling of None."""
+    serialize_item = compile_model(field.model)
+    allow_null, default = field.allow_null, field.default
+
+    def serialize_nested(value):
+        if value is None:
+            if allow_null:
+                return None
+            if default is not None:
+                return default
+        return serialize_item(value)
+    return serialize_nested
+
+
+def _list_serializer(field):
+    """Serializer for a List of Nested models, falling back to List.format for unusual values."""
+    serialize_item = _nested_serializer(field.container)
+
+    def serialize_list(value):
+        if value is None:
+            return field._v("default")
+        if isinstance(value, (list, tuple)):
+            return [serialize_item(item) for item in value]
+        if isinstance(value, (dict, str)) or not hasattr(value, "__iter__"):
+            return [marshal(value, field.container.nested)]
+        return [serialize_item(item) for item in value]
+    return serialize_list
+
+
+def _field_expression(i, key, field, attribute, namespace, getter):
+    """Returns the source of an expression computing one output value, adding helpers to `namespace`."""
+    source = getter.format(attr=repr(attribute))
+    field_type = type(field)
+
+    if field_type is fields.Nested and not field.skip_none and not field.mask:
+        namespace[f"nested{i}"] = _nested_serializer(field)
+        return f"nested{i}({source})"
+
+    if (field_type is fields.List and type(field.container) is fields.Nested and not field.mask
+            and not field.container.skip_none and not field.container.attribute):
+        namespace[f"list{i}"] = _list_serializer(field)
+        return f"list{i}({source})"
+
+    if not _has_default_output(field):
+        return None
+    none_value, static = _none_value(field)
+    if not static:
+        return None
+
+    namespace[f"none{i}"] = none_value
+    namespace[f"fmt{i}"] = field.format
+    formatted = _INLINE.get(field_type, "{fmt}(v)").format(fmt=f"fmt{i}")
+    return f"(none{i} if (v := {source}) is None else {formatted})"
+
+
+def _generate(model, getter):
+    namespace = {"marshal": marshal}
+    entries = []
+    for i, (key, field) in enumerate(model.items()):
+        if isinstance(field, type):
+            field = field()
+        attribute = _plain_attribute(key, field) if isinstance(field, fields.Raw) else None
+        expression = None
+        if attribute is not None:
+            expression = _field_expression(i, key, field, attribute, namespace, getter)
+        if expression is None:
+            # Anything unusual goes through flask-restx itself
+            if isinstance(field, dict):
+                namespace[f"model{i}"] = field
+                expression = f"marshal(obj, model{i})"
+            else:
+                namespace[f"output{i}"] = field.output
+                expression = f"output{i}({key!r}, obj)"
+        entries.append(f"        {key!r}: {expression},")
+
+    source = "def serialize(obj):\n    return {\n" + "\n".join(entries) + "\n    }\n"
+    exec(compile(source, f"<serializer {getattr(model, 'name', 'model')}>", "exec"), namespace)
+    return namespace["serialize"]
+
+
+def compile_model(model):
+    """
+    Compiles a flask-restx model (including inherited fields) into one flat
+    function that turns an object or dict into the same dict `marshal` would
+    produce. Common field types are inlined into generated code, nested models
+    are compiled recursively, and anything else is delegated to the field's own
+    `output`. Compiled functions are cached per model.
+    """
+    entry = _compiled.get(id(model))
+    if entry is not None:
+        return entry[1]
+
+    resolved = getattr(model, "resolved", model)
+    from_object = _generate(resolved, "getattr(obj, {attr}, None)")
+    from_dict = _generate(resolved, "obj.get({attr})")
+
+    def serialize(obj):
+        return from_dict(obj) if isinstance(obj, dict) else from_object(obj)
+
+    # Keep the model alive so its id is not reused by another model
+    _compiled[id(model)] = (model, serialize)
+    return serialize
+
+
+def serialize(data, model):
+    """Opt-in replacement for `ns.marshal(data, model)` using the compiled serializer of `model`."""
+    serialize_one = compile_model(model)
+    if isinstance(data, (list, tuple)):
+        return [serialize_one(item) for item in data]
+    return serialize_one(data)
+
+
+def dumps(data):
+    """Encodes data as compact JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass
+    return current_app.json.dumps(data, separators=(",", ":")).encode()
+
+
+def compress(body):
+    """
+    Compresses a response body with brotli or gzip when the client accepts it and
+    the body is above JSON_COMPRESS_MIN_SIZE. Returns (body, content_encoding).
+    """
+    if len(body) < current_app.config.get("JSON_COMPRESS_MIN_SIZE", 1024):
+        return body, None
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    encoding = request.accept_encodings.best_match(offered)
+    if encoding == "br":
+        return brotli.compress(body, quality=current_app.config.get("JSON_BROTLI_QUALITY", 4)), "br"
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=current_app.config.get("JSON_GZIP_LEVEL", 5)), "gzip"
+    return body, None
+
+
+def output_json(data, code, headers=None):
+    """flask-restx representation for application/json using `dumps` and `compress`."""
+    body, encoding = compress(dumps(data))
+    response = make_response(body, code)
+    response.headers.extend(headers or {})
+    response.headers["Content-Type"] = "application/json"
+    response.vary.add("Accept-Encoding")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return response
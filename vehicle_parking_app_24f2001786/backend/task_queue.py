@@ -0,0 +1,37 @@
+# Background Task Client
+
+from threading import Lock
+
+
+class TaskQueue:
+    """
+    Sends Celery tasks by their registered name ("tasks.<name>") instead of
+    through the task functions, so the web process never imports the task
+    modules and what they pull in (WeasyPrint, the mail templates). The
+    Celery client itself is created from celeryconfig on the first send.
+    """
+
+    def __init__(self):
+        self._celery = None
+        self._lock = Lock()
+
+    @property
+    def celery(self):
+        if self._celery is None:
+            with self._lock:
+                if self._celery is None:
+                    from celery import Celery
+                    celery = Celery("vehicle_parking_app")
+                    celery.config_from_object("celeryconfig")
+                    self._celery = celery
+        return self._celery
+
+    def send(self, name, *args, **kwargs):
+        """Queues the task registered as `name` and returns its AsyncResult."""
+        return self.celery.send_task(name, args=args, kwargs=kwargs)
+
+    def result(self, task_id):
+        return self.celery.AsyncResult(task_id)
+
+
+task_queue = TaskQueue()
@@ -6,4 +6,7 @@ logger = logging.getLogger(__name__)
 from .daily_reminders import send_daily_reminders
 from .reports import send_monthly_report, export_user_parking_data_to_csv
 from .new_user import send_welcome_email
-from .unused_token_removed import cleanup_expired_tokens
\ No newline at end of file
+from .unused_token_removed import cleanup_expired_tokens
+from .lot_counters import reconcile_lot_counters
+from .exports import cleanup_exports, export_reservations
+from .rollups import rebuild_lot_rollups
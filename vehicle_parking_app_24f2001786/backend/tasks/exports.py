@@ -0,0 +1,151 @@
+import os
+import csv
+import gzip
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from sqlalchemy import select
+from celery import shared_task
+from flask import current_app
+from models import db, ReservedParkingSpot, ParkingSpot, ParkingLot, Payment, User
+from tasks import logger
+from export_links import export_dir, download_url
+
+# --- Compressed CSV Export Files ---
+# Exports are streamed row by row into a gzip file under EXPORT_DIR, so memory
+# stays bounded however many rows there are. Files too large to mail are
+# handed out through a signed, expiring download link instead (see export_links).
+
+
+def write_csv_gz(filename, headers, rows, chunked=False):
+    """
+    Writes `rows` (any iterable) as a gzip-compressed CSV into the export folder.
+    With `chunked`, `rows` yields lists of rows that are written a chunk at a
+    time, and throughput is logged after each chunk.
+    The file is written under a temporary name and renamed when complete.
+    Returns (path, row_count, seconds).
+    """
+    path = os.path.join(export_dir(), filename)
+    tmp_path = f"{path}.part"
+    start = time.perf_counter()
+    count = 0
+    with gzip.open(tmp_path, "wt", newline="", encoding="utf-8", compresslevel=6) as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        if chunked:
+            for chunk in rows:
+                writer.writerows(chunk)
+                count += len(chunk)
+                log_throughput(filename, count, time.perf_counter() - start, done=False)
+        else:
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+    os.replace(tmp_path, path)
+    return path, count, time.perf_counter() - start
+
+
+def log_throughput(name, count, seconds, done=True):
+    rate = count / seconds if seconds else float(count)
+    verb = "wrote" if done else "written so far:"
+    logger.info(f"Export {name}: {verb} {count} row(s) in {seconds:.2f}s ({rate:,.0f} rows/sec).")
+
+
+@shared_task(ignore_results=False, name="tasks.export_reservations")
+def export_reservations(start_date=None, end_date=None, lot_id=None):
+    """
+    Exports the reservation history joined with spot, lot, user and payment, for
+    finance reconciliation. Optional filters: ISO dates (inclusive) and a lot id.
+    The query runs with stream_results, so rows arrive from a server-side cursor
+    in chunks of EXPORT_CHUNK_SIZE and each chunk goes straight into a gzip CSV.
+    Returns the file name, row count, rows/sec and a signed, admin-only download URL.
+    """
+    logger.info(f"Starting reservation export: start={start_date} end={end_date} lot={lot_id}")
+    query = (
+        select(
+            ReservedParkingSpot.id,
+            ReservedParkingSpot.parking_timestamp,
+            ReservedParkingSpot.leaving_timestamp,
+            ReservedParkingSpot.status,
+            ReservedParkingSpot.vehicle_number,
+            User.username,
+            ParkingLot.id,
+            ParkingLot.prime_location_name,
+            ParkingSpot.spot_number,
+            ReservedParkingSpot.parking_cost_per_hour,
+            Payment.amount,
+            Payment.payment_method,
+            Payment.payment_status,
+        )
+        .select_from(ReservedParkingSpot)
+        .outerjoin(User, ReservedParkingSpot.user_id == User.id)
+        .outerjoin(ParkingSpot, ReservedParkingSpot.spot_id == ParkingSpot.id)
+        .outerjoin(ParkingLot, ParkingSpot.lot_id == ParkingLot.id)
+        .outerjoin(Payment, Payment.reservation_id == ReservedParkingSpot.id)
+        .order_by(ReservedParkingSpot.id)
+    )
+    if start_date:
+        query = query.where(ReservedParkingSpot.parking_timestamp >= date.fromisoformat(start_date))
+    if end_date:
+        query = query.where(ReservedParkingSpot.parking_timestamp < date.fromisoformat(end_date) + timedelta(days=1))
+    if lot_id is not None:
+        query = query.where(ParkingSpot.lot_id == lot_id)
+
+    chunk_size = current_app.config["EXPORT_CHUNK_SIZE"]
+    result = db.session.execute(query.execution_options(stream_results=True, yield_per=chunk_size))
+
+    def chunks():
+        for partition in result.partitions():
+            yield [
+                (
+                    res_id,
+                    parked.isoformat() if parked else '',
+                    left.isoformat() if left else '',
+                    status.value if status else '',
+                    vehicle or '',
+                    username or '',
+                    spot_lot_id if spot_lot_id is not None else '',
+                    lot_name or '',
+                    spot_number or '',
+                    cost,
+                    amount if amount is not None else '',
+                    method or '',
+                    payment_status.value if payment_status else '',
+                )
+                for (res_id, parked, left, status, vehicle, username, spot_lot_id, lot_name,
+                     spot_number, cost, amount, method, payment_status) in partition
+            ]
+
+    headers = [
+        'reservation_id', 'parking_timestamp', 'leaving_timestamp', 'status', 'vehicle_number',
+        'username', 'lot_id', 'lot_name', 'spot_number', 'cost_per_hour',
+        'payment_amount', 'payment_method', 'payment_status',
+    ]
+    filename = f"reservations_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}.csv.gz"
+    try:
+        path, count, seconds = write_csv_gz(filename, headers, chunks(), chunked=True)
+    finally:
+        result.close()
+    log_throughput(filename, count, seconds)
+
+    return {
+        "filename": filename,
+        "rows": count,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(count / seconds) if seconds else count,
+        "size_bytes": os.path.getsize(path),
+        "download_url": download_url(filename, admin=True),
+    }
+
+
+@shared_task(ignore_results=False, name="tasks.cleanup_exports")
+def cleanup_exports():
+    """Removes export files whose download links have expired."""
+    cutoff = time.time() - current_app.config["EXPORT_LINK_MAX_AGE"]
+    removed = 0
+    for entry in os.scandir(export_dir()):
+        if entry.is_file() and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+            removed += 1
+    logger.info(f"Removed {removed} expired export file(s).")
+    return f"Removed {removed} expired export file(s)."
@@ -0,0 +1,36 @@
+from celery import shared_task
+from models import db, ParkingLot
+from tasks import logger
+from routes import cache_tags
+
+
+@shared_task(ignore_results=False, name="tasks.reconcile_lot_counters")
+def reconcile_lot_counters():
+    """
+    Rebuilds the denormalized available/occupied counters of every parking lot
+    from the parking_spots table and reports the lots whose counters had drifted.
+    The repair is a single UPDATE with correlated counts, so a booking or release
+    committed while the task runs is never overwritten with a stale count.
+    """
+    logger.info("Starting reconciliation of parking lot spot counters...")
+    try:
+        rows = ParkingLot.drifted_counts()
+        ParkingLot.recount()
+        db.session.commit()
+
+        drifted = [
+            f"lot {lot_id}: available {available_count}->{available}, occupied {occupied_count}->{occupied}"
+            for lot_id, available_count, occupied_count, available, occupied in rows
+        ]
+        if rows:
+            cache_tags.invalidate('lots:list', *(f'lot:{row[0]}' for row in rows))
+
+        if drifted:
+            logger.warning(f"Corrected spot counters for {len(drifted)} lot(s): " + "; ".join(drifted))
+        else:
+            logger.info("All parking lot spot counters are in sync.")
+        return f"Counter reconciliation complete. Corrected {len(drifted)} lot(s)."
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"An error occurred during counter reconciliation: {e}", exc_info=True)
+        return "An error occurred during counter reconciliation."
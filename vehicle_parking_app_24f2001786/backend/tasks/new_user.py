@@ -2,7 +2,7 @@ from celery import shared_task
 from tasks import logger
 from models import User
 from mail import send_email
-from jinja2 import Template
+from rendering import render_template
 
 
 
@@ -18,18 +18,7 @@ def send_welcome_email(email):
 
         subject = "Welcome to Our Parking App!"
         
-        html_template_str = """
-        <html>
-        <body style="font-family: sans-serif;">
-            <h3>Welcome, {{ full_name }}!</h3>
-            <p>Thank you for joining our platform. We're excited to help you find the best parking spots with ease.</p>
-            <p>You can start by searching for parking lots or booking a spot right away.</p>
-            <p>Best regards,<br>The Parking Team</p>
-        </body>
-        </html>
-        """
-        template = Template(html_template_str)
-        html_content = template.render(full_name=user.full_name)
+        html_content = render_template("welcome_email.html", full_name=user.full_name)
 
         send_email(user.email, subject, html_content)
         logger.info(f"Welcome email sent successfully to {user.email}")
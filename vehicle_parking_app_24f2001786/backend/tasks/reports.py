@@ -1,13 +1,19 @@
-import io
-import csv
+import os
 from datetime import datetime, timedelta, timezone
-from celery import shared_task
-from models import db, User, ReservedParkingSpot, ParkingLot, Payment, UserRole
-from mail import send_email
-from jinja2 import Template
+import uuid
+from celery import shared_task, chord
+from flask import current_app
+from models import db, User, ReservedParkingSpot, ParkingLot, ParkingSpot, Payment, UserRole, ReportDelivery
+from mail import send_email, send_many
 from collections import Counter
+from itertools import groupby
 from tasks import logger
-from weasyprint import HTML
+from tasks.exports import write_csv_gz, log_throughput
+from export_links import download_url
+from rendering import pdf_renderer, render_monthly_report
+
+# Users per render-and-send subtask of the monthly report
+REPORT_CHUNK_SIZE = 100
 
 # --- Helper Functions ---
 def get_last_month_dates():
@@ -19,206 +25,277 @@ def get_last_month_dates():
     return first_day_of_last_month, last_day_of_last_month
 
 
+def collect_monthly_insights(start_date, end_date, user_ids=None):
+    """
+    Computes every user's report insights in a single streamed pass over the
+    period's reservations, joined with their user, spot and lot and ordered by
+    user, instead of running several queries per user.
+    Yields one dict per user that had activity in the period, optionally
+    limited to `user_ids`.
+    """
+    query = (
+        db.session.query(
+            User.id,
+            User.username,
+            User.email,
+            ReservedParkingSpot.parking_timestamp,
+            ReservedParkingSpot.leaving_timestamp,
+            ReservedParkingSpot.parking_cost_per_hour,
+            ParkingSpot.lot_id,
+            ParkingLot.prime_location_name,
+        )
+        .join(ReservedParkingSpot, ReservedParkingSpot.user_id == User.id)
+        .outerjoin(ParkingSpot, ReservedParkingSpot.spot_id == ParkingSpot.id)
+        .outerjoin(ParkingLot, ParkingSpot.lot_id == ParkingLot.id)
+        .filter(
+            User.role != UserRole.ADMIN,
+            ReservedParkingSpot.parking_timestamp.between(start_date, end_date),
+        )
+    )
+    if user_ids is not None:
+        query = query.filter(User.id.in_(user_ids))
+    rows = query.order_by(User.id, ReservedParkingSpot.id).yield_per(1000)
+
+    for _, user_rows in groupby(rows, key=lambda row: row.id):
+        user_rows = list(user_rows)
+        first = user_rows[0]
+
+        total_spent = sum(row.parking_cost_per_hour for row in user_rows if row.parking_cost_per_hour)
+
+        # Most used parking lot
+        lot_counter = Counter(row.lot_id for row in user_rows if row.lot_id is not None)
+        lot_names = {row.lot_id: row.prime_location_name for row in user_rows}
+        most_used_lot_name = "N/A"
+        if lot_counter:
+            most_used_lot_name = lot_names[lot_counter.most_common(1)[0][0]] or "N/A"
+
+        # Peak usage day of the week
+        peak_day_counter = Counter(row.parking_timestamp.strftime('%A') for row in user_rows)
+        peak_day = peak_day_counter.most_common(1)[0][0] if peak_day_counter else "N/A"
+
+        # Average parking duration
+        durations = [
+            (row.leaving_timestamp - row.parking_timestamp).total_seconds() / 3600
+            for row in user_rows if row.leaving_timestamp and row.parking_timestamp
+        ]
+        avg_duration_hours = (sum(durations) / len(durations)) if durations else 0
+
+        yield {
+            "user_id": first.id,
+            "username": first.username,
+            "email": first.email,
+            "total_bookings": len(user_rows),
+            "total_spent": total_spent,
+            "most_used_lot_name": most_used_lot_name,
+            "peak_day": peak_day,
+            "avg_duration": f"{avg_duration_hours:.1f} hours",
+        }
+
+
 @shared_task(ignore_results=False, name="tasks.send_monthly_report")
 def send_monthly_report():
     """
-    Generates and sends a monthly activity report with an attached PDF to all users.
-    The report includes enhanced insights like peak usage days and average duration.
+    Coordinates the monthly activity report: finds the users with activity last
+    month that have not been sent their report yet, and fans them out in chunks
+    to parallel render-and-send subtasks. A chord callback aggregates the counts.
     """
-    if HTML is None:
+    if not pdf_renderer.available:
         logger.error("WeasyPrint is not installed. PDF reports cannot be generated.")
         return "Error: WeasyPrint is not installed."
 
     logger.info("Executing monthly report task with PDF attachment...")
     try:
-        users = User.query.filter(User.role != UserRole.ADMIN).all() 
         start_date, end_date = get_last_month_dates()
         # end_date = datetime.utcnow()
         # start_date = end_date - timedelta(days=30)
-        month_name = start_date.strftime("%B %Y")
-
-        logger.info(f"Found {len(users)} user(s) to process for the period: {start_date.date()} to {end_date.date()}.")
-
-        if not users:
-            logger.info("No users found to send reports to.")
-            return "No users in the system."
-
-        reports_sent_count = 0
-        for user in users:
-            reservations = ReservedParkingSpot.query.filter(
-                ReservedParkingSpot.user_id == user.id,
-                ReservedParkingSpot.parking_timestamp.between(start_date, end_date)
-            ).all()
-
-            logger.info(f"Processing user '{user.username}': Found {len(reservations)} reservations for the period.")
-
-            if not reservations:
-                continue  # Skip users with no activity
-
-            # --- Enhanced Insights ---
-            total_reservations = len(reservations)
-            total_spent = sum(res.parking_cost_per_hour for res in reservations if res.parking_cost_per_hour)
-
-            # Most used parking lot
-            lot_ids = [res.parking_spot.lot_id for res in reservations if res.parking_spot]
-            most_used_lot_name = "N/A"
-            if lot_ids:
-                most_common_lot_id = Counter(lot_ids).most_common(1)[0][0]
-                most_used_lot = ParkingLot.query.get(most_common_lot_id)
-                most_used_lot_name = most_used_lot.prime_location_name if most_used_lot else "N/A"
-
-            # Peak usage day of the week
-            peak_day_counter = Counter(res.parking_timestamp.strftime('%A') for res in reservations)
-            peak_day = peak_day_counter.most_common(1)[0][0] if peak_day_counter else "N/A"
-            
-            # Average parking duration
-            total_duration_hours = 0
-            completed_reservations = 0
-            for res in reservations:
-                if res.leaving_timestamp and res.parking_timestamp:
-                    duration = res.leaving_timestamp - res.parking_timestamp
-                    total_duration_hours += duration.total_seconds() / 3600
-                    completed_reservations += 1
-            
-            avg_duration_hours = (total_duration_hours / completed_reservations) if completed_reservations > 0 else 0
-            avg_duration_formatted = f"{avg_duration_hours:.1f} hours"
-
-
-            # --- Create HTML for both email body and PDF ---
-            html_template = """
-            <html>
-            <head>
-                <style>
-                    body { font-family: 'Helvetica Neue', Helvetica, Arial, sans-serif; color: #333; }
-                    .container { padding: 20px; border: 1px solid #eee; box-shadow: 0 0 10px rgba(0,0,0,0.05); }
-                    h2 { color: #0056b3; }
-                    ul { list-style-type: none; padding: 0; }
-                    li { margin-bottom: 10px; }
-                    strong { color: #0056b3; }
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <h2>Your Monthly Parking Report: {{ month_name }}</h2>
-                    <p>Hi {{ username }}, here are your parking insights for the past month:</p>
-                    <h3>Summary</h3>
-                    <ul>
-                        <li><strong>Total Bookings:</strong> {{ total_bookings }}</li>
-                        <li><strong>Total Spent:</strong> ${{ "%.2f"|format(total_spent) }}</li>
-                        <li><strong>Favorite Parking Lot:</strong> {{ most_used_lot_name }}</li>
-                    </ul>
-                    <h3>Usage Patterns</h3>
-                    <ul>
-                        <li><strong>Busiest Day:</strong> You parked most often on <strong>{{ peak_day }}s</strong>.</li>
-                        <li><strong>Average Stay:</strong> Your average parking duration was about <strong>{{ avg_duration }}</strong>.</li>
-                    </ul>
-                    <p>Thank you for using our service! Your detailed report is attached as a PDF.</p>
-                </div>
-            </body>
-            </html>
-            """
-            template = Template(html_template)
-            report_html = template.render(
-                username=user.username,
-                month_name=month_name,
-                total_bookings=total_reservations,
-                total_spent=total_spent,
-                most_used_lot_name=most_used_lot_name,
-                peak_day=peak_day,
-                avg_duration=avg_duration_formatted
-            )
+        period = start_date.strftime("%Y-%m")
+
+        logger.info(f"Collecting users to report on for the period: {start_date.date()} to {end_date.date()}.")
 
-            # --- Generate PDF in memory ---
-            pdf_data = HTML(string=report_html).write_pdf()
-            filename = f"Parking_Report_{month_name.replace(' ', '_')}.pdf"
-            
-            subject = f"Your Parking Report for {month_name}"
-            
-            # --- Send the email with the PDF attachment ---
-            send_email(
-                user.email,
-                subject,
-                report_html,  # The HTML report is the body of the email
-                attachment_data=pdf_data,
-                attachment_filename=filename
+        already_sent = db.session.query(ReportDelivery.user_id).filter(ReportDelivery.period == period)
+        user_ids = [
+            str(uuid.UUID(bytes=user_id)) for (user_id,) in
+            db.session.query(ReservedParkingSpot.user_id)
+            .join(User, ReservedParkingSpot.user_id == User.id)
+            .filter(
+                User.role != UserRole.ADMIN,
+                ReservedParkingSpot.parking_timestamp.between(start_date, end_date),
+                ~ReservedParkingSpot.user_id.in_(already_sent),
             )
-            reports_sent_count += 1
+            .distinct()
+        ]
+
+        if not user_ids:
+            logger.info("Monthly report task finished. No users are waiting for a report for the last month.")
+            return "Task completed. No reports sent as there was no pending user activity."
+
+        chunk_size = REPORT_CHUNK_SIZE
+        chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+        logger.info(f"Dispatching {len(user_ids)} report(s) in {len(chunks)} chunk(s).")
+
+        chord(
+            send_monthly_report_chunk.s(chunk, start_date.isoformat(), end_date.isoformat())
+            for chunk in chunks
+        )(summarize_monthly_report.s(period))
+        return f"Monthly reports dispatched for {len(user_ids)} user(s) in {len(chunks)} chunk(s)."
 
-        if reports_sent_count > 0:
-            logger.info(f"Monthly reports with PDF attachments sent successfully to {reports_sent_count} user(s).")
-            return f"Monthly reports completed. Sent {reports_sent_count} report(s)."
-        else:
-            logger.info("Monthly report task finished. No users had activity in the last month, so no reports were sent.")
-            return "Task completed. No reports sent as there was no user activity."
-            
     except Exception as e:
         logger.error(f"Error in send_monthly_report task: {e}", exc_info=True)
         return "An error occurred."
 
+
+@shared_task(ignore_results=False, name="tasks.send_monthly_report_chunk")
+def send_monthly_report_chunk(user_ids, start_date, end_date):
+    """
+    Renders and sends the monthly report for one chunk of users. Each sent report
+    is checkpointed in report_deliveries, so a rerun of the chunk skips it.
+    Returns the sent/failed counts for the chord callback.
+    """
+    start_date, end_date = datetime.fromisoformat(start_date), datetime.fromisoformat(end_date)
+    period = start_date.strftime("%Y-%m")
+    month_name = start_date.strftime("%B %Y")
+    ids = [uuid.UUID(user_id).bytes for user_id in user_ids]
+    sent_ids = {
+        user_id for (user_id,) in db.session.query(ReportDelivery.user_id).filter(
+            ReportDelivery.period == period, ReportDelivery.user_id.in_(ids)
+        )
+    }
+    pending = [user_id for user_id in ids if user_id not in sent_ids]
+
+    counts = {"sent": 0, "failed": 0, "skipped": len(ids) - len(pending)}
+    # Read the whole chunk before checkpointing: a commit would invalidate the streaming cursor
+    insights = list(collect_monthly_insights(start_date, end_date, pending))
+    # Emails are unique per user, so a sent message maps back to its user by address
+    users_by_address = {insight["email"]: insight["user_id"] for insight in insights}
+
+    def rendered():
+        # One report at a time, so only the PDF being sent is held in memory
+        for insight in insights:
+            try:
+                logger.info(f"Processing user '{insight['username']}': Found {insight['total_bookings']} reservations for the period.")
+                email = build_user_report(insight, month_name)
+            except Exception as e:
+                counts["failed"] += 1
+                logger.error(f"Failed to render monthly report for '{insight['username']}': {e}", exc_info=True)
+                continue
+            yield email
+
+    def checkpoint(email, sent):
+        # Committed as soon as SMTP accepts the message, so a retried chunk never sends it again
+        if not sent:
+            counts["failed"] += 1
+            return
+        db.session.add(ReportDelivery(user_id=users_by_address[email["to_address"]], period=period))
+        db.session.commit()
+        counts["sent"] += 1
+
+    # --- Send the whole chunk over one SMTP session ---
+    send_many(rendered(), on_result=checkpoint)
+    return counts
+
+
+@shared_task(ignore_results=False, name="tasks.summarize_monthly_report")
+def summarize_monthly_report(chunk_counts, period):
+    """Chord callback: aggregates the per-chunk counts of a monthly report run."""
+    totals = {"sent": 0, "failed": 0, "skipped": 0}
+    for counts in chunk_counts:
+        for key in totals:
+            totals[key] += counts.get(key, 0)
+
+    logger.info(
+        f"Monthly reports for {period}: sent {totals['sent']}, failed {totals['failed']}, "
+        f"skipped {totals['skipped']} already sent."
+    )
+    return f"Monthly reports completed. Sent {totals['sent']} report(s), {totals['failed']} failed."
+
+
+def build_user_report(insight, month_name):
+    """Renders one user's report as HTML and PDF and returns the send_email arguments for it."""
+    # --- Render the HTML body and the PDF from the precompiled template ---
+    report_html, pdf_data = render_monthly_report(insight, month_name)
+    filename = f"Parking_Report_{month_name.replace(' ', '_')}.pdf"
+
+    return dict(
+        to_address=insight['email'],
+        subject=f"Your Parking Report for {month_name}",
+        message=report_html,  # The HTML report is the body of the email
+        attachment_data=pdf_data,
+        attachment_filename=filename,
+    )
+
 # --- User-Triggered Async Task ---
 
 @shared_task(ignore_results=False, name="tasks.export_user_parking_data_to_csv")
 def export_user_parking_data_to_csv(user_id):
     """
-    Exports user parking data to a CSV in memory and emails it as an attachment.
-    This avoids creating and deleting temporary files, preventing race conditions.
+    Exports user parking data as a gzip-compressed CSV. Rows are streamed from one
+    joined query into the file, so memory stays bounded for large accounts.
+    Small exports are emailed as an attachment, larger ones as a signed download link.
     """
     logger.info(f"Starting CSV export for user_id: {user_id}")
     try:
-        user = User.query.get(user_id)
+        # Task arguments are JSON, so the id arrives as a UUID string
+        user = db.session.get(User, uuid.UUID(user_id).bytes if isinstance(user_id, str) else user_id)
         
         if not user:
             logger.warning(f"User with id {user_id} not found.")
             return "User not found."
 
-        reservations = ReservedParkingSpot.query.filter_by(user_id=user.id).order_by(ReservedParkingSpot.parking_timestamp.desc()).all()
+        rows = (
+            db.session.query(
+                ParkingSpot.lot_id,
+                ParkingSpot.spot_number,
+                ReservedParkingSpot.parking_timestamp,
+                ReservedParkingSpot.leaving_timestamp,
+                Payment.amount,
+            )
+            .select_from(ReservedParkingSpot)
+            .outerjoin(ParkingSpot, ReservedParkingSpot.spot_id == ParkingSpot.id)
+            .outerjoin(Payment, Payment.reservation_id == ReservedParkingSpot.id)
+            .filter(ReservedParkingSpot.user_id == user.id)
+            .order_by(ReservedParkingSpot.parking_timestamp.desc())
+            .yield_per(1000)
+        )
 
-        if not reservations:
+        headers = ['slot_id', 'spot_id', 'parking_timestamp', 'leaving_timestamp', 'cost', 'remarks']
+        filename = f"parking_export_{user.uuid}_{datetime.now().strftime('%Y%m%d')}.csv.gz"
+        path, count, seconds = write_csv_gz(filename, headers, (
+            [
+                lot_id if lot_id is not None else 'N/A',
+                spot_number or 'N/A',
+                parking_timestamp.isoformat() if parking_timestamp else '',
+                leaving_timestamp.isoformat() if leaving_timestamp else '',
+                amount or 0.0,
+                '' # Remarks column - currently empty as it's not in the model
+            ]
+            for lot_id, spot_number, parking_timestamp, leaving_timestamp, amount in rows
+        ))
+        log_throughput(filename, count, seconds)
+
+        if count == 0:
+            os.remove(path)
             subject = "Your Parking Data Export"
             message = f"Hi {user.username},\n\nYou requested an export of your parking data, but you have no reservations to export."
             send_email(user.email, subject, message, content="plain")
             logger.info(f"No reservations found for user {user.id}. Email sent.")
             return "No reservations to export."
 
-        # --- Generate CSV in memory ---
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Updated headers to match the new requirements
-        headers = ['slot_id', 'spot_id', 'parking_timestamp', 'leaving_timestamp', 'cost', 'remarks']
-        writer.writerow(headers)
-
-        for res in reservations:
-            writer.writerow([
-                res.parking_spot.lot_id if res.parking_spot else 'N/A',
-                res.parking_spot.spot_number if res.parking_spot else 'N/A',
-                res.parking_timestamp.isoformat() if res.parking_timestamp else '',
-                res.leaving_timestamp.isoformat() if res.leaving_timestamp else '',
-                res.payment.amount if res.payment else 0.0,
-                '' # Remarks column - currently empty as it's not in the model
-            ])
-        
-        csv_data = output.getvalue()
-        output.close()
-        
-        # Define the filename for the attachment
-        filename = f"parking_export_{user.uuid}_{datetime.now().strftime('%Y%m%d')}.csv"
-
-        # --- Send email with the CSV data as an attachment ---
         subject = "Your Parking Data Export is Ready"
-        message = f"Hi {user.username},\n\nPlease find your parking history attached."
-        
-        send_email(
-            user.email,
-            subject,
-            message,
-            content="plain",
-            attachment_data=csv_data,
-            attachment_filename=filename
-        )
+        if os.path.getsize(path) > current_app.config["EXPORT_ATTACHMENT_LIMIT"]:
+            # --- Too large to mail: send a signed, expiring download link ---
+            message = (
+                f"Hi {user.username},\n\nYour parking history ({count} reservations) is ready. "
+                f"Download it here:\n{download_url(filename)}"
+            )
+            send_email(user.email, subject, message, content="plain")
+        else:
+            # --- Send email with the compressed CSV as an attachment ---
+            message = f"Hi {user.username},\n\nPlease find your parking history attached."
+            send_email(user.email, subject, message, content="plain", attachment_file=path)
+            os.remove(path)
         
         logger.info(f"Successfully exported and sent data for user {user.username}.")
         return f"CSV export successful for user {user.id}."
     except Exception as e:
         logger.error(f"Error in export_user_parking_data_to_csv task: {e}", exc_info=True)
-        return "An error occurred during export."
\ No newline at end of file
+        return "An error occurred during export."
@@ -0,0 +1,60 @@
+from celery import shared_task
+from models import db, LotHourlyRollup, ReservedParkingSpot, ParkingSpot, ReservationStatus
+from models.lotRollup import hour_bucket
+from tasks import logger
+
+
+@shared_task(ignore_results=False, name="tasks.rebuild_lot_rollups")
+def rebuild_lot_rollups():
+    """
+    Rebuilds the lot_hourly_rollups table from the full reservation history.
+    Reservations are streamed once; the totals are accumulated per lot and hour
+    and written back in a single transaction.
+    The old rows are deleted first, which takes the SQLite write lock before the
+    history is read. Bookings and releases (whose rollup upserts share their
+    transaction) therefore either committed before the read and are counted,
+    or wait for the rebuild to commit and add their increments on top of it.
+    """
+    logger.info("Starting rebuild of the hourly lot rollups...")
+    try:
+        db.session.query(LotHourlyRollup).delete(synchronize_session=False)
+        rows = (
+            db.session.query(
+                ParkingSpot.lot_id,
+                ReservedParkingSpot.parking_timestamp,
+                ReservedParkingSpot.leaving_timestamp,
+                ReservedParkingSpot.status,
+                ReservedParkingSpot.parking_cost_per_hour,
+            )
+            .join(ParkingSpot, ReservedParkingSpot.spot_id == ParkingSpot.id)
+            .filter(ReservedParkingSpot.parking_timestamp.isnot(None))
+            .yield_per(5000)
+        )
+
+        totals = {}
+        def bump(row):
+            bucket = totals.setdefault(
+                (row["lot_id"], row["hour"]),
+                {"lot_id": row["lot_id"], "hour": row["hour"], "bookings": 0, "releases": 0, "occupied_minutes": 0.0, "revenue": 0.0},
+            )
+            for key in ("bookings", "releases", "occupied_minutes", "revenue"):
+                bucket[key] += row.get(key, 0)
+
+        reservations = 0
+        for lot_id, parked_at, left_at, status, cost in rows:
+            reservations += 1
+            bump({"lot_id": lot_id, "hour": hour_bucket(parked_at), "bookings": 1})
+            if status == ReservationStatus.COMPLETED and left_at:
+                for row in LotHourlyRollup.release_rows(lot_id, parked_at, left_at, cost):
+                    bump(row)
+
+        if totals:
+            db.session.execute(db.insert(LotHourlyRollup), list(totals.values()))
+        db.session.commit()
+
+        logger.info(f"Rebuilt {len(totals)} hourly rollup row(s) from {reservations} reservation(s).")
+        return f"Rollup rebuild complete. {len(totals)} row(s) from {reservations} reservation(s)."
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"An error occurred during the rollup rebuild: {e}", exc_info=True)
+        return "An error occurred during the rollup rebuild."
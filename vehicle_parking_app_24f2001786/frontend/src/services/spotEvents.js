@@ -0,0 +1,68 @@
+import { useAuthStore } from '../stores/auth';
+
+const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:5000';
+
+// Follows the admin spot event stream and calls `onDeltas` with each list of
+// {lot_id, spot_id, status, version} changes. EventSource cannot send the
+// Authorization header, so the stream is read with fetch. Reconnects after
+// errors and calls `onResync` whenever changes may have been missed.
+// Returns a function that closes the stream.
+export function subscribeSpotEvents({ onDeltas, onResync, lotId = null }) {
+  const auth = useAuthStore();
+  let controller = null;
+  let closed = false;
+
+  const dispatch = (block) => {
+    let event = 'message';
+    let data = '';
+    for (const line of block.split('\n')) {
+      if (line.startsWith('event:')) event = line.slice(6).trim();
+      else if (line.startsWith('data:')) data += line.slice(5).trim();
+    }
+    if (event === 'spots' && data) onDeltas(JSON.parse(data));
+    else if (event === 'resync') onResync();
+  };
+
+  const connect = async () => {
+    controller = new AbortController();
+    const url = new URL('/admin/parking-lots/stream', API_URL);
+    if (lotId !== null) url.searchParams.set('lot_id', lotId);
+    try {
+      const response = await fetch(url, {
+        headers: { Authorization: `Bearer ${auth.token}`, Accept: 'text/event-stream' },
+        credentials: 'include',
+        signal: controller.signal,
+      });
+      if (!response.ok) throw new Error(`Stream failed with ${response.status}`);
+
+      const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+      let buffer = '';
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += value;
+        let end;
+        while ((end = buffer.indexOf('\n\n')) !== -1) {
+          dispatch(buffer.slice(0, end));
+          buffer = buffer.slice(end + 2);
+        }
+      }
+    } catch (err) {
+      if (closed) return;
+      console.log(err);
+    }
+    if (!closed) {
+      setTimeout(() => {
+        if (closed) return;
+        onResync();
+        connect();
+      }, 5000);
+    }
+  };
+
+  connect();
+  return () => {
+    closed = true;
+    if (controller) controller.abort();
+  };
+}